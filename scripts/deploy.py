@@ -1,8 +1,41 @@
+from pathlib import Path
+
 from wake.deployment import *
 
+from pytypes.contracts.EIP712Example import EIP712Example
+from pytypes.contracts.PermitToken import PermitToken
+from pytypes.contracts.Token import Token
+from pytypes.contracts.Vault import SingleTokenVault
+
+from scripts.pipeline import DeploymentPipeline
+
 NODE_URL = "ENTER_NODE_URL_HERE"
 
+## confirmed steps are skipped when the script is run again
+MANIFEST = Path("deployments/manifest.json")
+
+MIN_DEPOSIT_AMOUNT = 10**18
+MAX_DEPOSIT_AMOUNT = 10**24
+TREASURY_MINT_AMOUNT = 10**24
+
+
+def build_pipeline(deployer: Account, treasury: Account, manifest: Path) -> DeploymentPipeline:
+    pipeline = DeploymentPipeline(deployer, manifest)
+
+    token = pipeline.deploy("token", Token)
+    pipeline.deploy("vault", SingleTokenVault, token, MIN_DEPOSIT_AMOUNT, MAX_DEPOSIT_AMOUNT)
+    pipeline.deploy("permit_token", PermitToken, treasury)
+    pipeline.deploy("eip712_example", EIP712Example)
+
+    pipeline.call("mint_treasury", token, "mintTokens", treasury, TREASURY_MINT_AMOUNT)
+    return pipeline
+
 
 @chain.connect(NODE_URL)
 def main():
-    chain.set_default_accounts(Account.from_alias("deployment"))
+    deployer = Account.from_alias("deployment")
+    chain.set_default_accounts(deployer)
+
+    addresses = build_pipeline(deployer, deployer, MANIFEST).run()
+    for name, address in addresses.items():
+        print(f"{name}: {address}")
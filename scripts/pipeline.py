@@ -0,0 +1,277 @@
+"""
+Pipelined deployment with a resumable manifest.
+
+Steps (deployments and configuration calls) are registered in dependency
+order; a step may reference earlier steps in its arguments, e.g.
+
+    pipeline = DeploymentPipeline(deployer, Path("deployments/manifest.json"))
+    token = pipeline.deploy("token", Token)
+    vault = pipeline.deploy("vault", SingleTokenVault, token, 10**18, 10**21)
+    pipeline.call("mint", token, "mintTokens", treasury, 10**24)
+    pipeline.run()
+
+The steps form a dependency graph and are run in waves: every wave sends
+all steps whose dependencies are confirmed, up to `max_in_flight`, without
+waiting for any receipt (`confirmations=0`), and then polls the receipts of
+the whole wave with one JSON-RPC batch request per poll. A step waits for its
+dependencies because Wake estimates its gas against the mined state. All
+transactions come from one deployer; nonces are assigned locally by Wake's
+per-sender counter in step order, and the CREATE address of a deployment
+(deployer + nonce) is written to the manifest as soon as it is sent.
+
+The manifest is written after every submission and every receipt:
+
+{
+  "chain_id": 31337,
+  "deployer": "0x...",
+  "steps": {
+    "token": {"status": "confirmed", "nonce": 0, "tx_hash": "0x...", "address": "0x...", "block_number": 1},
+    "vault": {"status": "sent", "nonce": 3, "tx_hash": "0x...", "address": "0x..."},
+    ...
+  }
+}
+
+A rerun skips confirmed steps. Steps sent in a previous run are reconciled
+first: mined ones are picked up from their receipts, ones still pending in
+the node (known by their hash, nonce not used yet) are waited for before
+anything new is sent, so new steps never take their nonces. Only dropped or
+reverted steps are sent again.
+
+Requests are sent over Wake's single connection to the node: the
+transactions of a wave are in flight together, but they are submitted one
+request after another, not over concurrent connections.
+"""
+import json
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from wake.deployment import *
+from wake.development.json_rpc.communicator import JsonRpcError
+
+SENT = "sent"
+CONFIRMED = "confirmed"
+
+
+@dataclass(eq=False)
+class Step:
+    name: str
+    ## pytypes contract class for deployments, None for calls
+    contract_type: Optional[type]
+    args: Tuple[Any, ...]
+    ## target step and function name for calls
+    target: Optional["Step"] = None
+    function: Optional[str] = None
+    deps: List["Step"] = field(default_factory=list)
+    address: Optional[Address] = None
+
+
+def _rlp_bytes(data: bytes) -> bytes:
+    if len(data) == 1 and data[0] < 0x80:
+        return data
+    assert len(data) < 56
+    return bytes([0x80 + len(data)]) + data
+
+
+def create_address(deployer: Address, nonce: int) -> Address:
+    ## keccak256(rlp([deployer, nonce]))[12:]
+    payload = _rlp_bytes(bytes.fromhex(str(deployer)[2:])) + _rlp_bytes(nonce.to_bytes((nonce.bit_length() + 7) // 8, "big"))
+    return Address("0x" + keccak256(bytes([0xc0 + len(payload)]) + payload)[12:].hex())
+
+
+def _status(receipt: Dict[str, Any]) -> int:
+    status = receipt["status"]
+    return int(status, 16) if isinstance(status, str) else status
+
+
+class DeploymentPipeline:
+    def __init__(
+        self,
+        deployer: Account,
+        manifest_path: Path,
+        max_in_flight: int = 16,
+        poll_interval: float = 1.0,
+        timeout: float = 600.0,
+    ):
+        assert max_in_flight > 0
+        self.deployer = deployer
+        self.chain = deployer.chain
+        self.manifest_path = manifest_path
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        ## called between receipt polls with poll_interval
+        self.sleep: Callable[[float], None] = time.sleep
+        self.steps: Dict[str, Step] = {}
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        manifest = {"chain_id": self.chain.chain_id, "deployer": str(self.deployer.address), "steps": {}}
+        if not self.manifest_path.exists():
+            return manifest
+        loaded = json.loads(self.manifest_path.read_text())
+        assert loaded["chain_id"] == manifest["chain_id"], f"manifest {self.manifest_path} is for chain {loaded['chain_id']}"
+        assert loaded["deployer"] == manifest["deployer"], f"manifest {self.manifest_path} is for deployer {loaded['deployer']}"
+        return loaded
+
+    def _save_manifest(self) -> None:
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        self.manifest_path.write_text(json.dumps(self.manifest, indent=2))
+
+    def _add(self, step: Step) -> Step:
+        assert step.name not in self.steps, f"duplicate step {step.name}"
+        step.deps = [arg for arg in step.args if isinstance(arg, Step)]
+        if step.target is not None:
+            step.deps.append(step.target)
+        self.steps[step.name] = step
+        return step
+
+    def deploy(self, name: str, contract_type: type, *args: Any) -> Step:
+        return self._add(Step(name, contract_type, args))
+
+    def call(self, name: str, target: Step, function: str, *args: Any) -> Step:
+        assert target.contract_type is not None, "calls must target a deployment step"
+        return self._add(Step(name, None, args, target=target, function=function))
+
+    def _resolve(self, arg: Any) -> Any:
+        if isinstance(arg, Step):
+            assert arg.address is not None, f"step {arg.name} has no address"
+            return arg.address
+        return arg
+
+    def _send(self, step: Step) -> TransactionAbc:
+        args = [self._resolve(arg) for arg in step.args]
+        if step.contract_type is not None:
+            tx = step.contract_type.deploy(*args, from_=self.deployer, chain=self.chain, confirmations=0, return_tx=True)
+            step.address = create_address(self.deployer.address, tx.nonce)
+        else:
+            target = step.target.contract_type(step.target.address, chain=self.chain)
+            tx = getattr(target, step.function)(*args, from_=self.deployer, confirmations=0)
+        self.manifest["steps"][step.name] = {
+            "status": SENT,
+            "nonce": tx.nonce,
+            "tx_hash": tx.tx_hash,
+            "address": str(step.address) if step.address is not None else None,
+        }
+        self._save_manifest()
+        return tx
+
+    def _receipts(self, tx_hashes: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Receipts of the given transactions (None for the ones not mined yet),
+        in one JSON-RPC batch request if the connection supports it.
+        """
+        interface = self.chain.chain_interface
+        communicator = getattr(interface, "_communicator", None)
+        send_recv = getattr(getattr(communicator, "_protocol", None), "send_recv", None)
+        if send_recv is not None and isinstance(getattr(communicator, "_request_id", None), int) and len(tx_hashes) > 1:
+            ## request ids are taken from the communicator, so they never clash with Wake's own requests
+            first_id = communicator._request_id
+            communicator._request_id += len(tx_hashes)
+            responses = send_recv(json.dumps([
+                {"jsonrpc": "2.0", "method": "eth_getTransactionReceipt", "params": [tx_hash], "id": first_id + i}
+                for i, tx_hash in enumerate(tx_hashes)
+            ]))
+            if isinstance(responses, list):
+                by_id = {response.get("id"): response for response in responses}
+                receipts = {}
+                for i, tx_hash in enumerate(tx_hashes):
+                    response = by_id[first_id + i]
+                    if "error" in response:
+                        raise JsonRpcError(response["error"])
+                    receipts[tx_hash] = response["result"]
+                return receipts
+        ## no batch support, one request per transaction
+        return {tx_hash: interface.get_transaction_receipt(tx_hash) for tx_hash in tx_hashes}
+
+    def _confirm_all(self, steps: List[Step]) -> None:
+        ## polls the receipts of all sent steps until every one is mined
+        waiting = {self.manifest["steps"][step.name]["tx_hash"]: step for step in steps}
+        deadline = time.monotonic() + self.timeout
+        while True:
+            for tx_hash, receipt in self._receipts(list(waiting)).items():
+                if receipt is not None:
+                    self._confirm(waiting.pop(tx_hash), receipt)
+            if not waiting:
+                return
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"steps {[step.name for step in waiting.values()]} not mined in {self.timeout}s")
+            self.sleep(self.poll_interval)
+
+    def _confirm(self, step: Step, receipt: Dict[str, Any]) -> None:
+        entry = self.manifest["steps"][step.name]
+        if _status(receipt) != 1:
+            error = self.chain.txs[entry["tx_hash"]].error
+            raise error if error is not None else RuntimeError(f"step {step.name} failed")
+        if step.contract_type is not None:
+            address = Address(receipt["contractAddress"])
+            assert address == step.address, f"{step.name} deployed at {address}, expected {step.address}"
+        entry["status"] = CONFIRMED
+        entry["block_number"] = int(receipt["blockNumber"], 16)
+        self._save_manifest()
+
+    def _reconcile(self, entry: Dict[str, Any]) -> Optional[str]:
+        """
+        CONFIRMED if a step sent by a previous run was mined since, SENT if it
+        is still pending, None if it was dropped or failed and has to be sent again.
+        """
+        if entry["status"] == CONFIRMED:
+            return CONFIRMED
+        interface = self.chain.chain_interface
+        try:
+            receipt = interface.get_transaction_receipt(entry["tx_hash"])
+        except JsonRpcError:
+            receipt = None
+        if receipt is not None:
+            if _status(receipt) != 1:
+                return None
+            entry["status"] = CONFIRMED
+            entry["block_number"] = int(receipt["blockNumber"], 16)
+            self._save_manifest()
+            return CONFIRMED
+
+        ## not mined, but still known to the node and its nonce not used by another transaction
+        try:
+            known = interface.get_transaction(entry["tx_hash"]) is not None
+        except JsonRpcError:
+            known = False
+        if known and interface.get_transaction_count(str(self.deployer.address), "latest") <= entry["nonce"]:
+            return SENT
+        return None
+
+    def run(self) -> Dict[str, Address]:
+        """
+        Sends every step not confirmed yet, wave by wave, and waits for all
+        receipts. Returns the address of every deployment step.
+        """
+        done = set()
+        pending = []
+        for name, entry in self.manifest["steps"].items():
+            step = self.steps.get(name)
+            state = self._reconcile(entry) if step is not None else None
+            if state is None:
+                continue
+            if entry.get("address") is not None:
+                step.address = Address(entry["address"])
+            done.add(step)
+            if state == SENT:
+                pending.append(step)
+        for step in done:
+            stale = [dep.name for dep in step.deps if dep not in done]
+            assert not stale, f"step {step.name} was sent, but its dependencies {stale} have to be sent again"
+        ## pending steps of a previous run hold the next nonces, nothing is sent before they are mined
+        if pending:
+            self._confirm_all(pending)
+
+        remaining = [step for step in self.steps.values() if step not in done]
+        while remaining:
+            wave = [step for step in remaining if all(dep in done for dep in step.deps)][:self.max_in_flight]
+            assert wave, f"steps {[step.name for step in remaining]} depend on steps that are not registered"
+            for step in wave:
+                self._send(step)
+            self._confirm_all(wave)
+            done.update(wave)
+            remaining = [step for step in remaining if step not in done]
+
+        return {name: step.address for name, step in self.steps.items() if step.address is not None}
@@ -0,0 +1,175 @@
+# Fuzzing throughput benchmarks, see tests/helpers/benchmark.py for the JSON format and the matrix runner.
+# Not collected by `wake test tests/`, run explicitly:
+#   wake test tests/bench_fuzzing.py
+# The matrix runner starts one process per cell, so peak RSS is measured per cell.
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+import pytest
+from wake.development.globals import get_config
+from wake.testing import *
+from wake.testing import Eip712Domain
+
+from pytypes.contracts.EIP712Example import EIP712Example
+from pytypes.contracts.Token import Token
+
+from tests.helpers import benchmark
+from tests.helpers.benchmark import RESULTS_DIR, BenchmarkRecorder, PeakRssCounter, env_list
+from tests.helpers.eip712 import sign_batch
+from tests.test_vault_fuzz_solution import VaultFuzz
+
+## the backend of this process, wake.toml is left untouched
+BACKEND = os.environ.get("WAKE_BENCH_BACKEND", get_config().testing.cmd)
+if BACKEND not in benchmark.SUPPORTED_BACKENDS:
+    pytest.skip(f"Wake cannot launch backend {BACKEND}", allow_module_level=True)
+get_config().update({"testing": {"cmd": BACKEND}}, [])
+
+ACCOUNTS = env_list("WAKE_BENCH_ACCOUNTS", benchmark.ACCOUNTS)
+FLOWS = env_list("WAKE_BENCH_FLOWS", benchmark.FLOWS)
+USERS = env_list("WAKE_BENCH_USERS", benchmark.USERS)
+SEQUENCES = 2
+TXS = 200
+SIGNING_PROCESSES = int(os.environ.get("WAKE_BENCH_SIGNING_PROCESSES", "1"))
+## bounded-memory campaign; every sequence is reverted at its end, so only sequences
+## longer than the retention window make the history grow past it
+MEMORY_FLOWS = int(os.environ.get("WAKE_BENCH_MEMORY_FLOWS", "1000000"))
+MEMORY_RETAINED_TXS = 1000
+MEMORY_SEQUENCE_FLOWS = 5 * MEMORY_RETAINED_TXS
+MAX_RSS_GROWTH_KB = int(os.environ.get("WAKE_BENCH_MAX_RSS_GROWTH_KB", str(32 * 1024)))
+
+recorder = BenchmarkRecorder(Path(os.environ.get("WAKE_BENCH_OUTPUT", RESULTS_DIR / f"{BACKEND}.json")))
+
+
+def node_pid() -> Optional[int]:
+    ## pid of the chain node launched by the current chain.connect(), None when connected to a running one
+    process = getattr(chain.chain_interface, "_process", None)
+    return process.pid if process is not None else None
+
+
+def peak_rss_kb() -> int:
+    return benchmark.peak_rss_kb(node_pid())
+
+
+def test_bench_vault_fuzz():
+    for accounts in ACCOUNTS:
+        with chain.connect(accounts=accounts):
+            for flows in FLOWS:
+                for users in USERS:
+                    if users > accounts:
+                        continue
+
+                    class BenchVaultFuzz(VaultFuzz):
+                        TRACKED_USERS = users
+                        PROFILE_DIR = RESULTS_DIR / "profiles"
+
+                    start = time.perf_counter()
+                    BenchVaultFuzz.run(SEQUENCES, flows)
+                    elapsed = time.perf_counter() - start
+
+                    profile = BenchVaultFuzz.last_profile.to_json()
+                    invariant_checks = sum(s["calls"] for s in profile["invariants"].values())
+                    txs = sum(s["transactions"] for section in profile.values() for s in section.values())
+
+                    recorder.record(
+                        benchmark="vault_fuzz",
+                        backend=BACKEND,
+                        accounts=accounts,
+                        flows=flows,
+                        users=users,
+                        flows_per_s=SEQUENCES * flows / elapsed,
+                        invariants_per_s=invariant_checks / elapsed,
+                        txs_per_s=txs / elapsed,
+                        peak_rss_kb=peak_rss_kb(),
+                    )
+
+
+@chain.connect()
+def test_bench_vault_fuzz_bounded_memory():
+    class BoundedVaultFuzz(VaultFuzz):
+        RETAINED_TXS = MEMORY_RETAINED_TXS
+        PROFILE_DIR = RESULTS_DIR / "profiles"
+
+    ## warm-up fills the retention window, the input pools and the interpreter caches,
+    ## and brings the node to its peak for a sequence of this length
+    BoundedVaultFuzz.run(1, MEMORY_SEQUENCE_FLOWS)
+
+    counter = PeakRssCounter(node_pid())
+    counter.start()
+    start = time.perf_counter()
+    BoundedVaultFuzz.run(MEMORY_FLOWS // MEMORY_SEQUENCE_FLOWS, MEMORY_SEQUENCE_FLOWS)
+    elapsed = time.perf_counter() - start
+
+    recorder.record(
+        benchmark="vault_fuzz_bounded_memory",
+        backend=BACKEND,
+        accounts=len(chain.accounts),
+        flows=MEMORY_FLOWS,
+        flows_per_s=MEMORY_FLOWS / elapsed,
+        peak_rss_kb=peak_rss_kb(),
+        rss_growth_kb=counter.growth_kb,
+    )
+    assert counter.growth_kb <= MAX_RSS_GROWTH_KB, f"peak RSS grew by {counter.growth_kb} kB over {MEMORY_FLOWS} flows"
+
+
+@chain.connect()
+def test_bench_token_transfer():
+    owner = chain.accounts[0]
+    token = Token.deploy(from_=owner)
+    token.mintTokens(owner.address, TXS, from_=owner)
+
+    start = time.perf_counter()
+    for i in range(TXS):
+        token.transfer(chain.accounts[1 + i % (len(chain.accounts) - 1)].address, 1, from_=owner)
+    elapsed = time.perf_counter() - start
+
+    recorder.record(
+        benchmark="token_transfer",
+        backend=BACKEND,
+        accounts=len(chain.accounts),
+        txs_per_s=TXS / elapsed,
+        peak_rss_kb=peak_rss_kb(),
+    )
+
+
+@chain.connect()
+def test_bench_eip712_votes():
+    voter = chain.accounts[0]
+    eip712_example = EIP712Example.deploy()
+
+    domain = Eip712Domain(
+        name="SimpleVoting",
+        version="1",
+        chainId=chain.chain_id,
+        verifyingContract=eip712_example.address,
+    )
+
+    votes = [EIP712Example.Vote(proposal=f"Proposal {nonce}", support=True, nonce=nonce) for nonce in range(TXS)]
+
+    ## type hash and domain separator are computed once, signatures come out as (v, r, s)
+    start = time.perf_counter()
+    signatures = sign_batch([(voter, vote) for vote in votes], domain, processes=SIGNING_PROCESSES)
+    signing = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for vote, (v, r, s) in zip(votes, signatures):
+        eip712_example.castVoteBySignature(
+            voter=voter.address,
+            proposal=vote.proposal,
+            support=vote.support,
+            v=v,
+            r=r,
+            s=s,
+            from_=chain.accounts[1],
+        )
+    casting = time.perf_counter() - start
+
+    recorder.record(
+        benchmark="eip712_votes",
+        backend=BACKEND,
+        accounts=len(chain.accounts),
+        signatures_per_s=TXS / signing,
+        txs_per_s=TXS / casting,
+        peak_rss_kb=peak_rss_kb(),
+    )
@@ -0,0 +1,130 @@
+import copy
+import functools
+import inspect
+import time
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from wake.testing import *
+from wake.testing.fuzzing import *
+
+from tests.helpers.scheduler import REVERTED, SKIPPED, AdaptiveScheduler
+
+
+class AdaptiveFuzzTest(FuzzTest):
+    """
+    FuzzTest whose flow weights adapt to the outcome of each flow call.
+
+    Every `@flow` is wrapped so that its outcome (skipped by returning a
+    string, reverted, succeeded, reached a new `scheduler_state()`) is recorded
+    and the flow's `weight` is updated before the runner's next draw. The
+    flows are still drawn and run by Wake, with its RNG, `precondition`,
+    `max_times`, pre_flow / post_flow and crash log, so a run stays
+    reproducible from the `-S` seed and can be shrunk with `-SH`. A flow that
+    keeps skipping loses weight down to its lower bound; a flow that can tell
+    it has nothing to do before it runs should declare a `precondition`
+    instead, so it is never drawn. At the end of the run a summary with raw
+    flows per second and transactions per second is printed.
+
+    Subclasses overriding pre_flow / post_flow must call super().
+    """
+
+    ## multipliers of the declared @flow weight that the adapted weight stays within
+    ADAPTIVE_WEIGHT_BOUNDS: Tuple[float, float] = (0.25, 4.0)
+    ## per flow name overrides of ADAPTIVE_WEIGHT_BOUNDS
+    ADAPTIVE_FLOW_BOUNDS: Dict[str, Tuple[float, float]] = {}
+    ADAPTIVE_ALPHA = 0.05
+    ## scheduler to start the next run() from instead of the declared weights, e.g. to replay a sequence of a worker pool
+    ADAPTIVE_INITIAL: Optional[AdaptiveScheduler] = None
+
+    _scheduler: AdaptiveScheduler
+    _adaptive_flows: Dict[str, Callable]
+    _flow_calls: int
+    _transactions: int
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for name, fn in list(vars(cls).items()):
+            if callable(fn) and hasattr(fn, "flow") and not hasattr(fn, "__adaptive__"):
+                setattr(cls, name, cls._wrap_flow(name, fn))
+
+    @staticmethod
+    def _wrap_flow(name: str, fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            return self._call_flow(name, args, kwargs)
+
+        wrapper.__adaptive__ = True
+        return wrapper
+
+    def scheduler_state(self) -> Optional[Hashable]:
+        ## coarse abstraction of the Python model, a flow reaching an unseen value is rewarded
+        return None
+
+    @classmethod
+    def run(cls, sequences_count: int, flows_count: int, *args, **kwargs):
+        cls._adaptive_flows = {
+            name: fn for name, fn in inspect.getmembers(cls) if getattr(fn, "__adaptive__", False)
+        }
+        declared = {name: getattr(fn, "__declared_weight__", fn.weight) for name, fn in cls._adaptive_flows.items()}
+        for name, fn in cls._adaptive_flows.items():
+            fn.__declared_weight__ = declared[name]
+
+        if cls.ADAPTIVE_INITIAL is not None:
+            cls._scheduler = copy.deepcopy(cls.ADAPTIVE_INITIAL)
+        else:
+            cls._scheduler = AdaptiveScheduler(declared, cls.ADAPTIVE_WEIGHT_BOUNDS, cls.ADAPTIVE_FLOW_BOUNDS, cls.ADAPTIVE_ALPHA)
+        for name, fn in cls._adaptive_flows.items():
+            fn.weight = cls._scheduler.weights[name]
+        cls._flow_calls = 0
+        cls._transactions = 0
+
+        start = time.perf_counter()
+        try:
+            super().run(sequences_count, flows_count, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            ## restore declared weights so that the next run starts from the same point
+            for name, fn in cls._adaptive_flows.items():
+                fn.weight = declared[name]
+            cls._print_schedule_report(elapsed)
+
+    @staticmethod
+    def _sent_txs() -> int:
+        ## Wake registers the hash of every sent transaction, also those mined together by BlockBatch
+        return len(chain._txs._tx_hashes)
+
+    def pre_flow(self, flow):
+        self._flow_start_txs = self._sent_txs()
+        super().pre_flow(flow)
+
+    def post_flow(self, flow):
+        ## counted before super(), helpers later in the MRO may trim the tx history in post_flow
+        type(self)._transactions += self._sent_txs() - self._flow_start_txs
+        super().post_flow(flow)
+
+    def _call_flow(self, name: str, args: tuple, kwargs: dict):
+        cls = type(self)
+        fn = cls._adaptive_flows[name]
+        cls._flow_calls += 1
+        try:
+            ret = fn.__wrapped__(self, *args, **kwargs)
+        except TransactionRevertedError:
+            cls._scheduler.record(name, REVERTED)
+            raise
+
+        fn.weight = cls._scheduler.record(name, cls._scheduler.outcome(ret, self.scheduler_state()))
+        return ret
+
+    @classmethod
+    def _print_schedule_report(cls, elapsed: float):
+        scheduler = cls._scheduler
+        elapsed = max(elapsed, 1e-9)
+        skipped = scheduler.total(SKIPPED)
+
+        print("")
+        print(f"flows: {cls._flow_calls} raw ({cls._flow_calls / elapsed:.1f}/s), "
+              f"{cls._flow_calls - skipped} effective, {skipped} skipped, {scheduler.total(REVERTED)} reverted")
+        print(f"transactions sent by flows: {cls._transactions} ({cls._transactions / elapsed:.1f}/s)")
+        for name, weight, outcomes in scheduler.report():
+            counts = ", ".join(f"{outcome} {count}" for outcome, count in sorted(outcomes.items()))
+            print(f"  {name:<32} weight {weight:8.2f}  {counts}")
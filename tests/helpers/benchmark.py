@@ -0,0 +1,219 @@
+"""
+Fuzzing throughput benchmarks.
+
+Results are stored as JSON:
+
+{
+  "version": 1,
+  "results": [
+    {"benchmark": "vault_fuzz", "backend": "anvil", "accounts": 10, "flows": 1000, "users": 10,
+     "flows_per_s": ..., "invariants_per_s": ..., "txs_per_s": ..., "peak_rss_kb": ...},
+    ...
+  ]
+}
+
+Peak RSS is the peak of the `wake test` process plus the peak of the local
+chain node it launched. Every cell of the matrix runs in its own `wake test`
+process with its own node, so the peaks belong to that cell only.
+
+Run the whole matrix on the backend configured in wake.toml (or on the
+given `testing.cmd` backends) and compare against the baseline. Backends
+Wake cannot launch are skipped:
+
+    python -m tests.helpers.benchmark --save-baseline
+    python -m tests.helpers.benchmark --backends anvil,hardhat
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+FORMAT_VERSION = 1
+
+BENCH_FILE = "tests/bench_fuzzing.py"
+RESULTS_DIR = Path(".wake/benchmarks")
+BASELINE = Path("benchmarks/baseline.json")
+
+## columns identifying one benchmark configuration
+KEY_FIELDS = ("benchmark", "backend", "accounts", "flows", "users")
+## metrics where a lower value is a regression, everything else (peak RSS) regresses upwards
+THROUGHPUT_METRICS = ("flows_per_s", "invariants_per_s", "txs_per_s", "signatures_per_s")
+MEMORY_METRICS = ("peak_rss_kb",)
+
+## vault_fuzz matrix, overridable with comma-separated WAKE_BENCH_ACCOUNTS / _FLOWS / _USERS
+ACCOUNTS = (10, 50, 200)
+FLOWS = (100, 1000)
+USERS = (10, 50, 200)
+## `testing.cmd` values Wake can launch a node for, other backends are skipped
+SUPPORTED_BACKENDS = ("anvil", "ganache", "hardhat")
+## benchmarks run as a single cell each
+SINGLE_BENCHMARKS = ("test_bench_vault_fuzz_bounded_memory", "test_bench_token_transfer", "test_bench_eip712_votes")
+
+
+def env_list(name: str, default: Sequence[int]) -> List[int]:
+    value = os.environ.get(name)
+    if not value:
+        return list(default)
+    return [int(v) for v in value.split(",")]
+
+
+def process_peak_rss_kb(pid: int) -> int:
+    ## VmHWM is the peak resident set size of a running process, in kilobytes (Linux only, 0 elsewhere)
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def peak_rss_kb(node_pid: Optional[int] = None) -> int:
+    ## this process (ru_maxrss is in kilobytes on Linux) plus the chain node it launched, if any
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if node_pid is not None:
+        peak += process_peak_rss_kb(node_pid)
+    return peak
+
+
+class PeakRssCounter:
+    """
+    Growth of the peak RSS of this process and the chain node at `node_pid`
+    (if any) since `start()`.
+
+    Started after a warm-up, a campaign with flat memory use does not move
+    the peak at all, so any growth is memory retained by the run. The growth
+    is checked against an absolute limit rather than the baseline, a few
+    hundred kilobytes of allocator noise would be a large relative change.
+    """
+
+    def __init__(self, node_pid: Optional[int] = None):
+        self.node_pid = node_pid
+        self.started_kb = peak_rss_kb(node_pid)
+
+    def start(self) -> None:
+        self.started_kb = peak_rss_kb(self.node_pid)
+
+    @property
+    def growth_kb(self) -> int:
+        return peak_rss_kb(self.node_pid) - self.started_kb
+
+
+def result_key(result: Dict[str, Any]) -> Tuple:
+    return tuple(result.get(field) for field in KEY_FIELDS)
+
+
+class BenchmarkRecorder:
+    def __init__(self, path: Path):
+        self.path = path
+        self.results: List[Dict[str, Any]] = []
+
+    def record(self, **result: Any) -> None:
+        self.results.append(result)
+        ## written after every result, so an interrupted matrix keeps what was measured
+        save(self.path, self.results)
+
+
+def save(path: Path, results: List[Dict[str, Any]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"version": FORMAT_VERSION, "results": results}, indent=2, sort_keys=True))
+
+
+def load(path: Path) -> List[Dict[str, Any]]:
+    data = json.loads(path.read_text())
+    assert data["version"] == FORMAT_VERSION, f"unsupported benchmark format {data['version']}"
+    return data["results"]
+
+
+def compare(
+    baseline: List[Dict[str, Any]], current: List[Dict[str, Any]], threshold: float = 0.1
+) -> List[str]:
+    """
+    Regressions of `current` against `baseline` larger than `threshold` (relative), one line each.
+    """
+    base = {result_key(r): r for r in baseline}
+    regressions = []
+    for result in current:
+        old = base.get(result_key(result))
+        if old is None:
+            continue
+        name = " ".join(f"{field}={result.get(field)}" for field in KEY_FIELDS if result.get(field) is not None)
+        for metric in THROUGHPUT_METRICS + MEMORY_METRICS:
+            if metric not in result or not old.get(metric):
+                continue
+            change = (result[metric] - old[metric]) / old[metric]
+            if (metric in THROUGHPUT_METRICS and change < -threshold) or (metric in MEMORY_METRICS and change > threshold):
+                regressions.append(f"{name}: {metric} {old[metric]:.1f} -> {result[metric]:.1f} ({change:+.1%})")
+    return regressions
+
+
+def cells() -> List[Tuple[str, Dict[str, str]]]:
+    """
+    (pytest node id, environment) of every cell of the matrix.
+    """
+    result = []
+    for accounts in env_list("WAKE_BENCH_ACCOUNTS", ACCOUNTS):
+        for flows in env_list("WAKE_BENCH_FLOWS", FLOWS):
+            for users in env_list("WAKE_BENCH_USERS", USERS):
+                if users > accounts:
+                    continue
+                env = {"WAKE_BENCH_ACCOUNTS": str(accounts), "WAKE_BENCH_FLOWS": str(flows), "WAKE_BENCH_USERS": str(users)}
+                result.append((f"{BENCH_FILE}::test_bench_vault_fuzz", env))
+    for name in SINGLE_BENCHMARKS:
+        result.append((f"{BENCH_FILE}::{name}", {}))
+    return result
+
+
+def _run_cell(backend: Optional[str], node_id: str, env: Dict[str, str], output: Path) -> int:
+    ## the backend is passed through the environment, bench_fuzzing.py sets `testing.cmd` from it
+    env = dict(os.environ, **env, WAKE_BENCH_OUTPUT=str(output))
+    if backend is not None:
+        env["WAKE_BENCH_BACKEND"] = backend
+    output.unlink(missing_ok=True)
+    return subprocess.run(["wake", "test", node_id], env=env).returncode
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the fuzzing benchmark matrix.")
+    parser.add_argument("--backends", default=None, help="comma-separated testing.cmd values, the one in wake.toml by default")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    results: List[Dict[str, Any]] = []
+    backends: List[Optional[str]] = args.backends.split(",") if args.backends else [None]
+    for backend in backends:
+        if backend is not None and backend not in SUPPORTED_BACKENDS:
+            print(f"backend {backend} skipped, Wake only launches {', '.join(SUPPORTED_BACKENDS)}")
+            continue
+        for i, (node_id, env) in enumerate(cells()):
+            output = RESULTS_DIR / "cells" / f"{backend or 'configured'}-{i}.json"
+            if _run_cell(backend, node_id, env, output) != 0:
+                print(f"benchmark {node_id} {' '.join(f'{k}={v}' for k, v in env.items())} on {backend or 'the configured backend'} failed", file=sys.stderr)
+                return 1
+            results.extend(load(output))
+
+    save(RESULTS_DIR / "latest.json", results)
+
+    if args.save_baseline:
+        save(args.baseline, results)
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"no baseline at {args.baseline}, run with --save-baseline first")
+        return 0
+
+    regressions = compare(load(args.baseline), results, args.threshold)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
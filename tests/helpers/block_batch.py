@@ -0,0 +1,57 @@
+from typing import Callable, List, Optional
+
+from wake.testing import *
+
+
+class BlockBatch:
+    """
+    Sends several transactions with automine off and mines them together in one block.
+
+    with BlockBatch() as batch:
+        batch.send(token.approve, vault, amount, from_=user)
+        deposit_tx = batch.send(vault.deposit, amount, from_=user)
+
+    assert deposit_tx.error is None
+
+    Transactions are submitted without waiting for receipts and are mined in
+    submission order when the block ends. Receipts are fetched right after the
+    block is mined, so afterwards every tx object reports its own events and
+    revert error. Gas cannot be estimated against state that is still pending,
+    so every transaction gets a fixed `gas_limit`.
+    """
+
+    def __init__(self, gas_limit: int = 1_000_000):
+        self.gas_limit = gas_limit
+        self.txs: List[TransactionAbc] = []
+        self._automine: Optional[bool] = None
+
+    def __enter__(self) -> "BlockBatch":
+        self._automine = chain.automine
+        chain.automine = False
+        return self
+
+    def send(self, fn: Callable, *args, **kwargs) -> TransactionAbc:
+        kwargs.setdefault("gas_limit", self.gas_limit)
+        tx = fn(*args, confirmations=0, **kwargs)
+        self.txs.append(tx)
+        return tx
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        try:
+            if self.txs:
+                chain.mine()
+        finally:
+            chain.automine = self._automine
+
+        if exc_type is None:
+            for tx in self.txs:
+                tx.wait()
+
+    @property
+    def tx_count(self) -> int:
+        ## transactions mined in the batch block, one block may count for many transactions
+        return len(self.txs)
+
+    @property
+    def errors(self) -> List[Optional[TransactionRevertedError]]:
+        return [tx.error for tx in self.txs]
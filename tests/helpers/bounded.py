@@ -0,0 +1,115 @@
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from wake.testing import *
+from wake.testing.fuzzing import *
+
+from tests.helpers.report_paths import report_path
+from tests.helpers.retention import SpillLog, trim_history
+
+
+def _retained_from_env() -> Optional[int]:
+    value = os.environ.get("WAKE_RETAINED_TXS")
+    return int(value) if value else None
+
+
+def tx_record(tx: Any) -> Dict[str, Any]:
+    ## compact on-disk form of a transaction, only what a crash report needs
+    record: Dict[str, Any] = {}
+    for name in ("block_number", "tx_index", "from_", "to", "value", "status", "gas_used"):
+        try:
+            value = getattr(tx, name)
+        except Exception:
+            continue
+        record[name] = str(getattr(value, "address", value)) if value is not None else None
+    try:
+        record["data"] = bytes(tx.data).hex()
+    except Exception:
+        pass
+    return record
+
+
+class BoundedMemoryFuzzTest(FuzzTest):
+    """
+    FuzzTest keeping at most RETAINED_TXS transactions reachable from the
+    chain history, for long campaigns whose flows only look at their latest
+    transaction.
+
+    Wake's chain history (`chain.txs`) keeps the hash of every sent
+    transaction, and every transaction object looked up through it (with its
+    receipt, decoded events and call trace once they were accessed) stays
+    cached. After every flow, the oldest hashes beyond RETAINED_TXS are
+    evicted together with their cached objects and written as compact records
+    (block, sender, target, calldata, status, gas; only the hash of a
+    transaction that was never looked up) to a log in TX_SPILL_DIR.
+    `lookup_tx(tx_hash)` finds a transaction in either place, e.g. for crash
+    reports. Helpers that keep their own per-transaction state can be created
+    with `self.RETAINED_TXS` and `self.spill` to evict into the same log.
+
+    Chain snapshots copy the history, and the revert at the end of every
+    sequence drops what the sequence sent, so the history only grows within
+    a sequence; RETAINED_TXS only matters for sequences sending more.
+
+    RETAINED_TXS = None (the default, or WAKE_RETAINED_TXS unset) keeps everything.
+
+    Subclasses overriding post_flow must call super().
+    """
+
+    RETAINED_TXS: Optional[int] = _retained_from_env()
+    TX_SPILL_DIR = Path(".wake/logs/txs")
+
+    ## kept on the class, so it is not part of the Python model
+    _spill_log: Optional[SpillLog] = None
+
+    @classmethod
+    def run(cls, sequences_count: int, flows_count: int, *args, **kwargs):
+        if cls.RETAINED_TXS is None:
+            return super().run(sequences_count, flows_count, *args, **kwargs)
+
+        cls._spill_log = SpillLog(report_path(cls.TX_SPILL_DIR, "txs", ".jsonl"))
+        try:
+            super().run(sequences_count, flows_count, *args, **kwargs)
+        except Exception:
+            print("")
+            print(f"{cls._spill_log.count} evicted transactions written to {cls._spill_log.path}")
+            raise
+        finally:
+            cls._spill_log.close()
+            cls._spill_log = None
+
+    @staticmethod
+    def _chain_txs() -> Any:
+        ## the ChainTransactions behind chain.txs, hashes oldest first plus a cache of loaded objects
+        txs = getattr(chain, "_txs", None)
+        return txs if hasattr(txs, "_tx_hashes") and hasattr(txs, "_transactions") else None
+
+    def spill(self, tx_hash: str, record: Dict[str, Any]) -> None:
+        if self._spill_log is not None:
+            self._spill_log.write(tx_hash, record)
+
+    def _trim(self, txs: Any) -> None:
+        trim_history(
+            txs._tx_hashes,
+            txs._transactions,
+            self.RETAINED_TXS,
+            lambda tx_hash, tx: self.spill(tx_hash, tx_record(tx) if tx is not None else {}),
+            key=str.lower,
+        )
+
+    def post_flow(self, flow):
+        super().post_flow(flow)
+        txs = self._chain_txs()
+        if self.RETAINED_TXS is not None and txs is not None:
+            self._trim(txs)
+
+    def lookup_tx(self, tx_hash: str) -> Any:
+        """
+        The retained transaction object, the spilled record of an evicted one, or None.
+        """
+        txs = self._chain_txs()
+        if txs is not None and tx_hash.lower() in {h.lower() for h in txs._tx_hashes}:
+            return txs[tx_hash]
+        if self._spill_log is not None:
+            return self._spill_log.lookup(tx_hash)
+        return None
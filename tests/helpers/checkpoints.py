@@ -0,0 +1,303 @@
+import inspect
+import json
+import os
+import time
+import traceback
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from wake.testing import *
+from wake.testing import random
+from wake.testing.fuzzing import *
+from wake.testing.fuzzing import fuzz_shrink
+
+from tests.helpers.model import copy_model, restore_model
+from tests.helpers.report_paths import report_path
+from tests.helpers.shrinking import shrink_flows
+
+
+@dataclass
+class FlowCall:
+    ## position in the original sequence
+    index: int
+    name: str
+    ## random state right before the flow body ran
+    random_state: Any
+
+
+@dataclass
+class Checkpoint:
+    ## index of the first flow call executed after the checkpoint
+    index: int
+    snapshot_id: Any
+    model: Dict[str, Any]
+    ## the state of the original run, not of a shrinking candidate
+    original: bool = True
+
+
+@dataclass
+class Failure:
+    ## ("flow" | "invariant", name) of the failing step
+    step: Tuple[str, str]
+    ## flow calls up to the failure, up to the first violation if a sampled invariant check was bisected
+    calls: List[FlowCall]
+    shrunk: Optional[List[FlowCall]] = None
+
+
+class _Recording:
+    def __init__(self):
+        self.calls: List[FlowCall] = []
+        ## in the order the snapshots were taken
+        self.checkpoints: List[Checkpoint] = []
+        ## state before the call removed by the previous brute force candidate
+        self.base: Optional[Checkpoint] = None
+        self.replaying = False
+        ## check every invariant after every replayed flow, ignoring their periods
+        self.every_flow = False
+        self.shrunk: Optional[List[FlowCall]] = None
+
+
+class CheckpointedFuzzTest(FuzzTest):
+    """
+    FuzzTest recording every flow call and, when shrinking is enabled, a
+    checkpoint (chain snapshot + model copy) every CHECKPOINT_INTERVAL calls,
+    used to shrink failing sequences. Wake keeps a copy of the transaction
+    history for every chain snapshot until it is reverted to, so the entries
+    of checkpoints that are dropped (at the end of each sequence or when a
+    replay invalidates them) are removed from the chain as well.
+
+    With CHECKPOINT_SHRINK (or WAKE_CHECKPOINT_SHRINK=1) a failing sequence is
+    shrunk in the same run, trying the same removals in the same order as
+    Wake's `-SH` shrinker (see shrink_flows). Flow type removal candidates
+    resume from the nearest checkpoint before their first removed call
+    instead of replaying the sequence from pre_sequence, brute force
+    candidates resume from a snapshot taken before the previously removed call.
+    Each call is replayed with its recorded random state, so InputPools in
+    the model must be reset in pre_flow (InputPools.new_flow), and a candidate reproduces the failure if it raises the same error from
+    the same line of the test module. The minimal sequence is printed and written to SHRINK_DIR.
+
+    Subclasses overriding pre_sequence, pre_flow or pre_invariant must call super().
+    Flows taking generated parameters are not supported.
+    """
+
+    CHECKPOINT_INTERVAL = 100
+    CHECKPOINT_SHRINK = os.environ.get("WAKE_CHECKPOINT_SHRINK", "0") == "1"
+    SHRINK_DIR = Path(".wake/logs/shrinks")
+
+    ## kept on the class, so it is not part of the model copied into checkpoints
+    _recording: _Recording = _Recording()
+    _instance: Optional["CheckpointedFuzzTest"] = None
+    _flows_count: int = 0
+    ## failing step and flow calls of the last failed run()
+    last_failure: Optional[Failure] = None
+
+    @classmethod
+    def run(cls, sequences_count: int, flows_count: int, *args, **kwargs):
+        cls._recording = _Recording()
+        cls._flows_count = flows_count
+        cls.last_failure = None
+        try:
+            super().run(sequences_count, flows_count, *args, **kwargs)
+        except Exception as e:
+            if cls._instance is not None:
+                cls._instance.on_failure(e)
+                recording = cls._recording
+                cls.last_failure = Failure(cls._instance._step, recording.calls, recording.shrunk)
+            raise
+        finally:
+            cls._discard(cls._recording.checkpoints)
+            cls._instance = None
+
+    def pre_sequence(self):
+        type(self)._instance = self
+        ## Wake reverted the previous sequence, its checkpoints are gone from the node
+        self._discard(self._recording.checkpoints)
+        type(self)._recording = _Recording()
+        super().pre_sequence()
+
+    def pre_flow(self, flow):
+        self._step = ("flow", flow.__name__)
+        self._record_call(flow.__name__)
+        super().pre_flow(flow)
+
+    def pre_invariant(self, invariant):
+        self._step = ("invariant", invariant.__name__)
+        super().pre_invariant(invariant)
+
+    def _record_call(self, name: str) -> None:
+        recording = self._recording
+        if recording.replaying:
+            return
+        index = len(recording.calls)
+        if index % self.CHECKPOINT_INTERVAL == 0 and self._takes_checkpoints():
+            recording.checkpoints.append(Checkpoint(index, chain.snapshot(), copy_model(vars(self))))
+        recording.calls.append(FlowCall(index, name, random.getstate()))
+
+    def _takes_checkpoints(self) -> bool:
+        return self.CHECKPOINT_SHRINK
+
+    @staticmethod
+    def _discard(checkpoints: List[Checkpoint]) -> None:
+        ## Chain.revert forgets only the snapshot reverted to, the others keep their copy of the tx history
+        for checkpoint in checkpoints:
+            chain._snapshots.pop(checkpoint.snapshot_id, None)
+
+    def on_failure(self, error: Exception) -> None:
+        ## called with the chain and the model as they were when the sequence failed
+        if self.CHECKPOINT_SHRINK:
+            self._shrink(error)
+
+    def _invariants(self) -> List[Callable]:
+        return [fn for _, fn in inspect.getmembers(type(self)) if hasattr(fn, "invariant")]
+
+    def _replay(
+        self,
+        calls: List[FlowCall],
+        required: List[bool],
+        start: int,
+        executed: int = 0,
+        save_at: Optional[int] = None,
+    ) -> Optional[Tuple[int, Exception]]:
+        """
+        Replays `calls[start:]` the way Wake's shrinker does: calls not
+        required are skipped together with their invariants, the others run
+        if their precondition holds. Invariant periods count from `executed`,
+        the number of executed calls before `start`. Returns the index of the
+        failing call and the error, or None.
+        """
+        recording = self._recording
+        invariants = self._invariants()
+        periods = {inv: executed % getattr(inv, "period", 1) for inv in invariants}
+        first_removed = next((i for i, keep in enumerate(required) if not keep), len(required))
+        originals = {c.index for c in recording.checkpoints if c.original}
+
+        j = start
+        try:
+            for j, call in enumerate(calls[start:], start):
+                if j == save_at:
+                    self._save_base(j)
+                elif j % self.CHECKPOINT_INTERVAL == 0 and j <= first_removed and j not in originals:
+                    ## the original prefix, worth a checkpoint again for later candidates
+                    recording.checkpoints.append(Checkpoint(j, chain.snapshot(), copy_model(vars(self))))
+
+                random.setstate(call.random_state)
+                self._flow_num = j
+                fn = getattr(type(self), call.name)
+                if required[j] and (not hasattr(fn, "precondition") or fn.precondition(self)):
+                    self.pre_flow(fn)
+                    fn(self)
+                    self.post_flow(fn)
+
+                self.pre_invariants()
+                if fuzz_shrink.ONLY_TARGET_INVARIANTS and not recording.every_flow:
+                    check = j == len(calls) - 1
+                else:
+                    check = required[j]
+                if check:
+                    for invariant in invariants:
+                        if periods[invariant] == 0 or recording.every_flow:
+                            self.pre_invariant(invariant)
+                            invariant(self)
+                            self.post_invariant(invariant)
+                        periods[invariant] = (periods[invariant] + 1) % getattr(invariant, "period", 1)
+                self.post_invariants()
+            if len(calls) == self._flows_count:
+                self.post_sequence()
+        except Exception as e:
+            return j, e
+        return None
+
+    def _save_base(self, index: int) -> None:
+        recording = self._recording
+        if recording.base is not None and recording.base in recording.checkpoints:
+            recording.checkpoints.remove(recording.base)
+            self._discard([recording.base])
+        recording.base = Checkpoint(index, chain.snapshot(), copy_model(vars(self)), original=False)
+        recording.checkpoints.append(recording.base)
+
+    def _checkpoint_before(self, index: int) -> Checkpoint:
+        return max((c for c in self._recording.checkpoints if c.original and c.index <= index), key=lambda c: c.index)
+
+    def _restore(self, checkpoint: Checkpoint) -> None:
+        recording = self._recording
+        chain.revert(checkpoint.snapshot_id)
+        ## reverting consumes the snapshot and invalidates every snapshot taken after it
+        index = recording.checkpoints.index(checkpoint)
+        self._discard(recording.checkpoints[index + 1:])
+        del recording.checkpoints[index:]
+        checkpoint.snapshot_id = chain.snapshot()
+        recording.checkpoints.append(checkpoint)
+        restore_model(self, checkpoint.model)
+
+    def _failing_line(self, error: Exception) -> Optional[Tuple[int, str]]:
+        module = inspect.getsourcefile(type(self))
+        frames = [frame for frame in traceback.extract_tb(error.__traceback__) if frame.filename == module]
+        return (frames[-1].lineno, frames[-1].name) if frames else None
+
+    def _same_failure(self, error: Exception, original: Exception) -> bool:
+        ## Wake's compare_exceptions, except that the line is looked up in the test module,
+        ## both errors pass through the frames of these helpers first
+        if type(error) is not type(original):
+            return False
+        if isinstance(error, Error) and error.message != original.message:
+            return False
+        if isinstance(error, Panic) and error.code != original.code:
+            return False
+        if fuzz_shrink.EXACT_EXCEPTION_MATCH and error.args != original.args:
+            return False
+        return self._failing_line(error) == self._failing_line(original)
+
+    def _shrink(self, error: Exception) -> List[FlowCall]:
+        recording = self._recording
+        recording.replaying = True
+        failed_step = self._step
+        original = recording.calls
+        start = time.perf_counter()
+
+        def reproduces(required: List[bool], first: int, save_at: Optional[int]) -> Optional[int]:
+            base = recording.base
+            if first > 0 and base is not None and base.index == first and base in recording.checkpoints:
+                checkpoint, executed = base, 0
+            else:
+                ## the candidate runs the original calls up to its first removed one
+                checkpoint = self._checkpoint_before(required.index(False))
+                executed = checkpoint.index
+            self._restore(checkpoint)
+            failure = self._replay(original[:failing[0] + 1], required, checkpoint.index, executed, save_at)
+            if failure is None or not self._same_failure(failure[1], error):
+                return None
+            if fuzz_shrink.EXACT_FLOW_INDEX and failure[0] != failing[0]:
+                return None
+            failing[0] = failure[0]
+            return failure[0]
+
+        failing = [len(original) - 1]
+        kept = [original[i] for i in shrink_flows([call.name for call in original], failing[0], reproduces)]
+        ## the last candidate may have failed elsewhere or not at all
+        self._step = failed_step
+        recording.shrunk = kept
+
+        elapsed = time.perf_counter() - start
+        path = self._save_shrunk(error, original, kept)
+        print("")
+        print(f"shrunk {len(original)} flows to {len(kept)} in {elapsed:.1f}s, failing {failed_step[0]} {failed_step[1]}:")
+        for call in kept:
+            print(f"  #{call.index} {call.name}")
+        print(f"shrunk sequence written to {path}")
+        return kept
+
+    def _save_shrunk(self, error: Exception, original: List[FlowCall], kept: List[FlowCall]) -> Path:
+        self.SHRINK_DIR.mkdir(parents=True, exist_ok=True)
+        path = report_path(self.SHRINK_DIR, "shrink", ".json")
+        path.write_text(json.dumps({
+            "test": type(self).__name__,
+            "error": repr(error),
+            "failing_step": list(self._step),
+            "original_flows": len(original),
+            "flows": [
+                {"index": call.index, "name": call.name, "random_state": [call.random_state[0], list(call.random_state[1]), call.random_state[2]]}
+                for call in kept
+            ],
+        }, indent=1))
+        return path
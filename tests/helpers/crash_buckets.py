@@ -0,0 +1,278 @@
+"""
+Shared-directory coordination of a fuzzing campaign over several machines.
+
+The coordinator plans a campaign into a shared directory (e.g. an NFS mount),
+workers on any node claim seed ranges from it and write a report for every
+failing sequence, the coordinator collects the reports into crash buckets:
+
+    <root>/campaign.json           test, flows per sequence, setup and campaign seed
+    <root>/leases/pending/<a>-<b>  sequence index ranges not claimed yet
+    <root>/leases/claimed/<a>-<b>@<worker>
+    <root>/leases/done/<a>-<b>@<worker>
+    <root>/reports/*.json          crash reports not collected yet
+    <root>/crashes/<signature>.json  one bucket per crash signature
+
+Claiming a range is an atomic rename, so no two workers run the same range.
+Workers touch their claimed lease after every sequence; leases not touched
+for `stale_after` seconds are handed out again, so a lost node only costs
+its current range.
+
+A crash signature is the failing step (flow, invariant or other method of
+the test, e.g. post_sequence), the error type and the innermost frames of
+the reverting call path. Each bucket counts
+the crashes with its signature and keeps the reproducer with the fewest
+flows. Only the coordinator writes buckets.
+
+    python -m tests.helpers.crash_buckets plan --root /mnt/fuzz --test VaultFuzz --sequences 10000
+    python -m tests.helpers.crash_buckets collect --root /mnt/fuzz --wait
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+## innermost frames of the reverting call path that are part of a signature
+SIGNATURE_FRAMES = 3
+
+
+def crash_signature(step: Tuple[str, str], error_type: str, frames: Sequence[str]) -> str:
+    ## frames are outermost first, only the innermost SIGNATURE_FRAMES count
+    key = "|".join([f"{step[0]}:{step[1]}", error_type, ">".join(frames[-SIGNATURE_FRAMES:])])
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+@dataclass
+class CrashReport:
+    signature: str
+    ## ("flow" | "invariant" | "hook" | "frame", name)
+    step: Tuple[str, str]
+    error_type: str
+    frames: List[str]
+    worker: str
+    index: int
+    setup_seed: int
+    seed: int
+    ## flow calls up to the failure, or of the shrunk sequence
+    flows: int
+    error: str
+    traceback: str = ""
+    ## names of the shrunk flow calls, if the sequence was shrunk
+    shrunk: Optional[List[str]] = None
+
+    @classmethod
+    def create(cls, step: Tuple[str, str], error_type: str, frames: Sequence[str], **kwargs: Any) -> "CrashReport":
+        return cls(crash_signature(step, error_type, frames), tuple(step), error_type, list(frames), **kwargs)
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "CrashReport":
+        return cls(**{**data, "step": tuple(data["step"])})
+
+
+def _write_atomic(path: Path, data: Any) -> None:
+    ## readers on other nodes never see a partially written file
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(data, indent=1))
+    os.replace(tmp, path)
+
+
+@dataclass
+class Campaign:
+    test: str
+    flows_count: int
+    sequences_count: int
+    campaign_seed: int
+    setup_seed: int
+
+    def seed(self, index: int) -> int:
+        ## the seed of a sequence depends only on the campaign and its index, not on the worker running it
+        return random.Random(f"{self.campaign_seed}:{index}").getrandbits(64)
+
+
+@dataclass(frozen=True)
+class Lease:
+    start: int
+    stop: int
+    worker: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.start}-{self.stop}"
+
+    @classmethod
+    def parse(cls, filename: str) -> "Lease":
+        name, _, worker = filename.partition("@")
+        start, stop = name.split("-")
+        return cls(int(start), int(stop), worker or None)
+
+
+class SharedDirectory:
+    def __init__(self, root: Path, stale_after: Optional[float] = None):
+        self.root = root
+        self.stale_after = stale_after
+        self.pending = root / "leases" / "pending"
+        self.claimed = root / "leases" / "claimed"
+        self.done = root / "leases" / "done"
+        self.reports = root / "reports"
+        self.crashes = root / "crashes"
+
+    def plan(self, campaign: Campaign, range_size: int) -> None:
+        assert range_size > 0
+        assert not (self.root / "campaign.json").exists(), f"{self.root} already holds a campaign"
+        for directory in (self.pending, self.claimed, self.done, self.reports, self.crashes):
+            directory.mkdir(parents=True, exist_ok=True)
+        for start in range(0, campaign.sequences_count, range_size):
+            (self.pending / Lease(start, min(start + range_size, campaign.sequences_count)).name).touch()
+        _write_atomic(self.root / "campaign.json", asdict(campaign))
+
+    def campaign(self) -> Campaign:
+        return Campaign(**json.loads((self.root / "campaign.json").read_text()))
+
+    ## worker side
+
+    def claim(self, worker: str) -> Optional[Lease]:
+        assert "@" not in worker
+        for path in sorted(self.pending.iterdir(), key=lambda p: Lease.parse(p.name).start):
+            lease = Lease.parse(path.name)
+            try:
+                os.rename(path, self.claimed / f"{lease.name}@{worker}")
+            except FileNotFoundError:
+                ## claimed by another worker in the meantime
+                continue
+            return Lease(lease.start, lease.stop, worker)
+        return None
+
+    def heartbeat(self, lease: Lease) -> None:
+        try:
+            os.utime(self.claimed / f"{lease.name}@{lease.worker}")
+        except FileNotFoundError:
+            pass
+
+    def complete(self, lease: Lease) -> None:
+        try:
+            os.rename(self.claimed / f"{lease.name}@{lease.worker}", self.done / f"{lease.name}@{lease.worker}")
+        except FileNotFoundError:
+            ## handed out again as stale, the other worker completes it
+            pass
+
+    def report(self, report: CrashReport) -> Path:
+        path = self.reports / f"{report.worker}-{report.index}.json"
+        _write_atomic(path, asdict(report))
+        return path
+
+    ## coordinator side
+
+    def requeue_stale(self) -> List[Lease]:
+        if self.stale_after is None:
+            return []
+        requeued = []
+        now = time.time()
+        for path in list(self.claimed.iterdir()):
+            try:
+                if now - path.stat().st_mtime < self.stale_after:
+                    continue
+                lease = Lease.parse(path.name)
+                os.rename(path, self.pending / lease.name)
+            except FileNotFoundError:
+                continue
+            requeued.append(lease)
+        return requeued
+
+    def finished(self) -> bool:
+        return not any(self.pending.iterdir()) and not any(self.claimed.iterdir())
+
+    def collect(self) -> List[CrashReport]:
+        """
+        Moves every new report into its bucket. Returns the reports that
+        opened a new bucket.
+        """
+        new = []
+        for path in sorted(self.reports.glob("*.json")):
+            report = CrashReport.from_json(json.loads(path.read_text()))
+            if self._add(report):
+                new.append(report)
+            path.unlink()
+        return new
+
+    def _add(self, report: CrashReport) -> bool:
+        path = self.crashes / f"{report.signature}.json"
+        if not path.exists():
+            _write_atomic(path, {"count": 1, "seen_by": [report.worker], "reproducer": asdict(report)})
+            return True
+        bucket = json.loads(path.read_text())
+        bucket["count"] += 1
+        if report.worker not in bucket["seen_by"]:
+            bucket["seen_by"].append(report.worker)
+        if report.flows < bucket["reproducer"]["flows"]:
+            bucket["reproducer"] = asdict(report)
+        _write_atomic(path, bucket)
+        return False
+
+    def buckets(self) -> Dict[str, Dict[str, Any]]:
+        return {path.stem: json.loads(path.read_text()) for path in sorted(self.crashes.glob("*.json"))}
+
+    def summary(self) -> List[str]:
+        lines = []
+        for signature, bucket in sorted(self.buckets().items(), key=lambda item: -item[1]["count"]):
+            reproducer = CrashReport.from_json(bucket["reproducer"])
+            kind, name = reproducer.step
+            lines.append(
+                f"{signature} x{bucket['count']} {kind} {name} {reproducer.error_type} "
+                f"[{' > '.join(reproducer.frames[-SIGNATURE_FRAMES:])}] "
+                f"shortest: {reproducer.flows} flows, replay WAKE_POOL_REPLAY={reproducer.setup_seed:#x}:{reproducer.seed:#x}"
+            )
+        return lines
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Plan a distributed fuzzing campaign and collect its crashes.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    plan = subparsers.add_parser("plan")
+    plan.add_argument("--root", type=Path, required=True)
+    plan.add_argument("--test", required=True)
+    plan.add_argument("--sequences", type=int, required=True)
+    plan.add_argument("--flows", type=int, default=200)
+    plan.add_argument("--range-size", type=int, default=50)
+    plan.add_argument("--seed", type=lambda s: int(s, 0), default=None)
+
+    collect = subparsers.add_parser("collect")
+    collect.add_argument("--root", type=Path, required=True)
+    collect.add_argument("--wait", action="store_true", help="collect until every range is done")
+    collect.add_argument("--stale-after", type=float, default=600.0)
+    collect.add_argument("--interval", type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    if args.command == "plan":
+        rng = random.Random(args.seed)
+        campaign = Campaign(args.test, args.flows, args.sequences, rng.getrandbits(64), rng.getrandbits(64))
+        SharedDirectory(args.root).plan(campaign, args.range_size)
+        print(f"planned {args.sequences} sequences of {args.test} in {args.root}")
+        return 0
+
+    shared = SharedDirectory(args.root, args.stale_after)
+    while True:
+        for lease in shared.requeue_stale():
+            print(f"range {lease.name} of {lease.worker} is stale, handed out again")
+        for report in shared.collect():
+            print(f"new crash {report.signature}: {report.step[0]} {report.step[1]} {report.error_type} ({report.worker})")
+        if not args.wait or shared.finished():
+            break
+        time.sleep(args.interval)
+    ## reports written after the last ranges were completed
+    shared.collect()
+
+    lines = shared.summary()
+    for line in lines:
+        print(line)
+    print(f"{len(lines)} unique crashes")
+    return 1 if lines else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+from typing import Collection, Generic, Hashable, List, Set, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+
+
+class DirtySet(Generic[K]):
+    """
+    Keys (accounts, contracts) touched by flows since the last invariant check.
+
+    Invariants iterate `select(model)` instead of the whole model, so a check
+    costs O(touched) instead of O(all accounts ever seen). Every
+    `full_sweep_period` flows (and whenever `request_full_sweep()` is called)
+    `select` returns every key of the model instead.
+    """
+
+    def __init__(self, full_sweep_period: int = 100):
+        assert full_sweep_period > 0
+        self.full_sweep_period = full_sweep_period
+        self._touched: Set[K] = set()
+        self._flows_since_sweep = 0
+        ## first check after pre_sequence always covers the whole model
+        self.full_sweep = True
+
+    def touch(self, *keys: K) -> None:
+        self._touched.update(keys)
+
+    def select(self, model: Collection[K]) -> List[K]:
+        if self.full_sweep:
+            return list(model)
+        return [key for key in self._touched if key in model]
+
+    def flow_done(self) -> None:
+        self._flows_since_sweep += 1
+        if self._flows_since_sweep >= self.full_sweep_period:
+            self.full_sweep = True
+
+    def request_full_sweep(self) -> None:
+        self.full_sweep = True
+
+    def checked(self) -> None:
+        ## call once all invariants have run for the current flow
+        self._touched.clear()
+        if self.full_sweep:
+            self.full_sweep = False
+            self._flows_since_sweep = 0
+
+    def __copy_model__(self) -> "DirtySet[K]":
+        copied = DirtySet(self.full_sweep_period)
+        copied._touched = set(self._touched)
+        copied._flows_since_sweep = self._flows_since_sweep
+        copied.full_sweep = self.full_sweep
+        return copied
@@ -0,0 +1,185 @@
+import inspect
+import multiprocessing
+import os
+import socket
+import tempfile
+import traceback
+from pathlib import Path
+from typing import Any, List, Optional, Tuple, Type
+
+from wake.testing import *
+from wake.testing import random
+from wake.testing.fuzzing import *
+
+from tests.helpers.checkpoints import CheckpointedFuzzTest
+from tests.helpers.crash_buckets import Campaign, CrashReport, SharedDirectory
+from tests.helpers.worker_pool import _prepare, run_sequence
+
+## shared directory of a campaign planned with `python -m tests.helpers.crash_buckets plan`
+SHARED_DIR_ENV = "WAKE_FUZZ_SHARED_DIR"
+
+
+def _error_type(error: Exception) -> str:
+    ## panics differ by code (overflow, division by zero, ...), not by type
+    code = getattr(error, "code", None)
+    if type(error).__name__ == "Panic" and code is not None:
+        return f"Panic({int(code):#x})"
+    return type(error).__name__
+
+
+def _reverting_frames(error: Exception) -> List[str]:
+    ## Contract.function along the reverting call path, outermost first
+    tx = getattr(error, "tx", None)
+    if tx is None:
+        return []
+    try:
+        trace = tx.call_trace
+    except Exception as e:
+        ## e.g. anvil launched without --steps-tracing
+        print(f"call trace of {tx.tx_hash} unavailable ({e!r}), the crash signature uses Python frames")
+        return []
+    frames = []
+    while trace is not None:
+        frames.append(f"{trace.contract_name}.{trace.function_name}")
+        trace = next((sub for sub in trace.subtraces if not sub.status), None)
+    return frames
+
+
+def _python_frames(error: Exception) -> List[str]:
+    ## without a reverting transaction (e.g. a failed assert) the test's own frames are used, without line numbers
+    frames = traceback.extract_tb(error.__traceback__)
+    return [f"{Path(frame.filename).stem}.{frame.name}" for frame in frames if "site-packages" not in frame.filename]
+
+
+def _failing_step(test_class: Type[FuzzTest], error: Exception) -> Tuple[str, str]:
+    ## innermost flow or invariant, else the innermost other method of the test (a hook such as
+    ## post_sequence or pre_invariants), else the innermost frame outside of installed packages
+    frames = traceback.extract_tb(error.__traceback__)
+    module = inspect.getsourcefile(test_class)
+    hook = None
+    for frame in reversed(frames):
+        fn = getattr(test_class, frame.name, None)
+        if hasattr(fn, "flow"):
+            return "flow", frame.name
+        if hasattr(fn, "invariant"):
+            return "invariant", frame.name
+        if hook is None and callable(fn) and frame.filename == module:
+            hook = frame.name
+    if hook is not None:
+        return "hook", hook
+    frames = [frame for frame in frames if "site-packages" not in frame.filename] or frames
+    if frames:
+        return "frame", f"{Path(frames[-1].filename).stem}.{frames[-1].name}"
+    return "sequence", type(error).__name__
+
+
+def crash_report(
+    test_class: Type[FuzzTest],
+    error: Exception,
+    worker: str,
+    index: int,
+    campaign: Campaign,
+) -> CrashReport:
+    ## from the traceback, the last step recorded by CheckpointedFuzzTest may be a flow that passed before a failing hook
+    step = _failing_step(test_class, error)
+    flows = campaign.flows_count
+    shrunk = None
+    failure = test_class.last_failure if issubclass(test_class, CheckpointedFuzzTest) else None
+    if failure is not None:
+        flows = len(failure.calls)
+        if failure.shrunk is not None:
+            shrunk = [call.name for call in failure.shrunk]
+            flows = len(shrunk)
+    return CrashReport.create(
+        step,
+        _error_type(error),
+        _reverting_frames(error) or _python_frames(error),
+        worker=worker,
+        index=index,
+        setup_seed=campaign.setup_seed,
+        seed=campaign.seed(index),
+        flows=flows,
+        error=repr(error),
+        traceback="".join(traceback.format_exception(type(error), error, error.__traceback__)),
+        shrunk=shrunk,
+    )
+
+
+def run_worker(test_class: Type[FuzzTest], root: Path, worker: Optional[str] = None, **connect_kwargs: Any) -> int:
+    """
+    Claims seed ranges of the campaign in `root` until none are left and runs
+    one sequence per index. Every failing sequence is reported to the shared
+    directory, the chain is then restarted and the range continues with the
+    next index. Returns the number of sequences run. Must be called outside
+    of `chain.connect()`.
+    """
+    shared = SharedDirectory(root)
+    campaign = shared.campaign()
+    assert campaign.test == test_class.__name__, f"campaign in {root} is for {campaign.test}"
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+
+    lease = shared.claim(worker)
+    next_index = lease.start if lease is not None else 0
+    count = 0
+    while lease is not None:
+        ## a failed sequence leaves the chain in an unknown state, it is restarted with a fresh deployment
+        with chain.connect(**connect_kwargs):
+            _prepare(test_class, campaign.setup_seed)
+            failed = False
+            while lease is not None and not failed:
+                for index in range(next_index, lease.stop):
+                    next_index = index + 1
+                    count += 1
+                    try:
+                        run_sequence(test_class, campaign.seed(index), campaign.flows_count)
+                    except Exception as e:
+                        path = shared.report(crash_report(test_class, e, worker, index, campaign))
+                        print(f"{worker}: sequence {index} failed, report {path}")
+                        failed = True
+                        break
+                    finally:
+                        shared.heartbeat(lease)
+                else:
+                    shared.complete(lease)
+                    lease = shared.claim(worker)
+                    next_index = lease.start if lease is not None else 0
+    return count
+
+
+def run_local(
+    test_class: Type[FuzzTest],
+    sequences_count: int,
+    flows_count: int,
+    workers: int,
+    range_size: int = 10,
+    root: Optional[Path] = None,
+    **connect_kwargs: Any,
+) -> SharedDirectory:
+    """
+    Plans a campaign and runs it with `workers` forked local worker processes
+    standing in for nodes, collecting crashes while they run. Uses a
+    temporary shared directory unless `root` is given. Seeds come from
+    Wake's `random`, so the campaign is reproducible from the `-S` seed of
+    `wake test`.
+    """
+    root = root or Path(tempfile.mkdtemp(prefix="wake-fuzz-"))
+    campaign = Campaign(test_class.__name__, flows_count, sequences_count, random.getrandbits(64), random.getrandbits(64))
+    shared = SharedDirectory(root)
+    shared.plan(campaign, range_size)
+
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(target=run_worker, args=(test_class, root, f"local{i}"), kwargs=connect_kwargs, daemon=True)
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    while any(process.is_alive() for process in processes):
+        for process in processes:
+            process.join(timeout=1)
+        for report in shared.collect():
+            print(f"new crash {report.signature}: {report.step[0]} {report.step[1]} {report.error_type} ({report.worker})")
+    shared.collect()
+
+    assert shared.finished(), f"workers exited with ranges left in {root}"
+    return shared
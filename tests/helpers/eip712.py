@@ -0,0 +1,194 @@
+import dataclasses
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple, get_args, get_origin, get_type_hints
+
+from wake.testing import *
+
+## (v, r, s) as expected by castVoteBySignature / permit
+Signature = Tuple[int, bytes, bytes]
+
+## EIP712Domain fields in their canonical order
+_DOMAIN_FIELDS = (("name", "string"), ("version", "string"), ("chainId", "uint256"), ("verifyingContract", "address"), ("salt", "bytes32"))
+
+_SIZED_TYPE = re.compile(r"^(u?int\d+|bytes\d+)$")
+
+
+def _solidity_type(hint: Any) -> str:
+    if get_origin(hint) in (list, tuple):
+        return _solidity_type(get_args(hint)[0]) + "[]"
+    if dataclasses.is_dataclass(hint):
+        return hint.__name__
+    ## uint256, bytes32, ... are int / bytes subclasses named after the Solidity type
+    name = getattr(hint, "__name__", "")
+    if _SIZED_TYPE.match(name):
+        return name
+    if hint is Address or hint is Account:
+        return "address"
+    if hint is str:
+        return "string"
+    if hint is bytes:
+        return "bytes"
+    if hint is bool:
+        return "bool"
+    if hint is int:
+        return "uint256"
+    raise TypeError(f"cannot derive the EIP-712 type of {hint}")
+
+
+def _word(solidity_type: str, value: Any) -> bytes:
+    ## encoding of a static value into one 32-byte word
+    if solidity_type == "address":
+        return bytes(12) + bytes.fromhex(str(getattr(value, "address", value))[2:])
+    if solidity_type == "bool":
+        return (1 if value else 0).to_bytes(32, "big")
+    if solidity_type.startswith("bytes"):
+        return bytes(value).ljust(32, b"\x00")
+    return int(value).to_bytes(32, "big", signed=solidity_type.startswith("int"))
+
+
+class StructEncoder:
+    """
+    EIP-712 hashStruct of one dataclass, with the type string, the type hash
+    and a per-field encoder built once. Field types are derived from the
+    dataclass annotations (wake `uint256`, `bytes32`, `Address`, `str`, ...)
+    or given explicitly as the primary type string, e.g.
+    "Vote(string proposal,bool support,uint256 nonce)".
+    """
+
+    def __init__(self, struct_type: type, type_string: Optional[str] = None):
+        self.struct_type = struct_type
+        hints = get_type_hints(struct_type)
+        names = [f.name for f in dataclasses.fields(struct_type)]
+
+        if type_string is None:
+            self.types = [_solidity_type(hints[name]) for name in names]
+        else:
+            members = re.fullmatch(r"\w+\((.*)\)", type_string).group(1)
+            self.types = [member.rsplit(" ", 1)[0] for member in members.split(",")] if members else []
+            assert len(self.types) == len(names), f"{type_string} does not match the fields of {struct_type.__name__}"
+
+        self.nested: Dict[str, StructEncoder] = {}
+        for name, solidity_type in zip(names, self.types):
+            hint = hints[name]
+            base = get_args(hint)[0] if get_origin(hint) in (list, tuple) else hint
+            if dataclasses.is_dataclass(base):
+                self.nested[base.__name__] = struct_encoder(base)
+
+        primary = f"{struct_type.__name__}({','.join(f'{t} {n}' for t, n in zip(self.types, names))})"
+        referenced = {}
+        for encoder in self.nested.values():
+            referenced[encoder.struct_type.__name__] = encoder.primary_type
+            referenced.update(encoder.referenced_types)
+        self.primary_type = primary
+        self.referenced_types = referenced
+        self.type_string = primary + "".join(referenced[name] for name in sorted(referenced))
+        self.type_hash = keccak256(self.type_string.encode())
+        self._fields = [(name, self._field_encoder(t)) for name, t in zip(names, self.types)]
+
+    def _field_encoder(self, solidity_type: str) -> Callable[[Any], bytes]:
+        if solidity_type.endswith("[]"):
+            element = self._field_encoder(solidity_type[:-2])
+            return lambda values: keccak256(b"".join(element(v) for v in values))
+        if solidity_type == "string":
+            return lambda value: keccak256(value.encode())
+        if solidity_type == "bytes":
+            return lambda value: keccak256(bytes(value))
+        if solidity_type in self.nested:
+            return self.nested[solidity_type].hash
+        return lambda value: _word(solidity_type, value)
+
+    def hash(self, message: Any) -> bytes:
+        return keccak256(self.type_hash + b"".join(encode(getattr(message, name)) for name, encode in self._fields))
+
+
+_encoders: Dict[type, StructEncoder] = {}
+_separators: Dict[Tuple, bytes] = {}
+
+
+def struct_encoder(struct_type: type, type_string: Optional[str] = None) -> StructEncoder:
+    try:
+        return _encoders[struct_type]
+    except KeyError:
+        encoder = _encoders[struct_type] = StructEncoder(struct_type, type_string)
+        return encoder
+
+
+def domain_separator(domain: Mapping[str, Any]) -> bytes:
+    ## cached per (name, version, chainId, verifyingContract, salt)
+    key = tuple((name, str(domain[name])) for name, _ in _DOMAIN_FIELDS if domain.get(name) is not None)
+    try:
+        return _separators[key]
+    except KeyError:
+        pass
+
+    fields = [(name, t) for name, t in _DOMAIN_FIELDS if domain.get(name) is not None]
+    type_hash = keccak256(f"EIP712Domain({','.join(f'{t} {n}' for n, t in fields)})".encode())
+    encoded = b"".join(
+        keccak256(domain[name].encode()) if t == "string" else _word(t, domain[name])
+        for name, t in fields
+    )
+    separator = _separators[key] = keccak256(type_hash + encoded)
+    return separator
+
+
+def signing_hash(message: Any, domain: Mapping[str, Any]) -> bytes:
+    return keccak256(b"\x19\x01" + domain_separator(domain) + struct_encoder(type(message)).hash(message))
+
+
+def split_signature(signature: bytes) -> Signature:
+    return signature[64], signature[0:32], signature[32:64]
+
+
+def sign(account: Account, message: Any, domain: Mapping[str, Any]) -> Signature:
+    """
+    (v, r, s) of the EIP-712 signature of `message`, same as
+    `split_signature(account.sign_structured(message, domain))`.
+    """
+    return split_signature(account.sign_hash(signing_hash(message, domain)))
+
+
+def _sign_hashes(private_key: bytes, hashes: Sequence[bytes]) -> List[bytes]:
+    account = Account.from_key(private_key)
+    return [account.sign_hash(h) for h in hashes]
+
+
+def sign_batch(
+    messages: Sequence[Tuple[Account, Any]],
+    domain: Mapping[str, Any],
+    processes: int = 1,
+) -> List[Signature]:
+    """
+    (v, r, s) for every (account, message) pair, in order.
+
+    Hashes are computed in this process with the cached encoders; with
+    `processes > 1` the signing itself is split into chunks per account
+    across a process pool. The private keys are sent to the workers, so this
+    is meant for test accounts only.
+    """
+    hashes = [signing_hash(message, domain) for _, message in messages]
+    if processes <= 1:
+        return [split_signature(account.sign_hash(h)) for (account, _), h in zip(messages, hashes)]
+
+    by_account: Dict[Account, List[int]] = {}
+    for i, (account, _) in enumerate(messages):
+        by_account.setdefault(account, []).append(i)
+
+    ## about `processes` chunks in total, a single account is split as well
+    chunk_size = max(1, -(-len(messages) // processes))
+    chunks = [
+        (account, indices[start:start + chunk_size])
+        for account, indices in by_account.items()
+        for start in range(0, len(indices), chunk_size)
+    ]
+
+    signatures: List[Optional[bytes]] = [None] * len(messages)
+    with ProcessPoolExecutor(processes) as pool:
+        futures = [
+            (indices, pool.submit(_sign_hashes, account.private_key, [hashes[i] for i in indices]))
+            for account, indices in chunks
+        ]
+        for indices, future in futures:
+            for i, signature in zip(indices, future.result()):
+                signatures[i] = signature
+    return [split_signature(s) for s in signatures]
@@ -0,0 +1,88 @@
+from dataclasses import fields
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, TypeVar, Union, get_type_hints
+from weakref import WeakKeyDictionary
+
+from wake.testing import *
+
+E = TypeVar("E")
+
+## tx object -> (event type, origin) -> decoded events; keyed by the object rather than the tx hash,
+## so a transaction sent again after a chain revert never sees the events of the reverted one,
+## and entries go away together with the transaction
+_cache: "WeakKeyDictionary[TransactionAbc, Dict[Tuple[type, Optional[Address]], list]]" = WeakKeyDictionary()
+
+_decoders: dict = {}
+
+
+def _is_hashed_topic(abi_type: str) -> bool:
+    ## indexed dynamic values are stored in the topic as keccak256 of their encoding
+    return abi_type in ("string", "bytes") or abi_type.endswith("]") or abi_type.startswith("tuple")
+
+
+def _decoder(event_type: Type[E]) -> Callable[[Any], E]:
+    try:
+        return _decoders[event_type]
+    except KeyError:
+        pass
+
+    hints = get_type_hints(event_type, include_extras=True)
+    params = [f.name for f in fields(event_type) if f.init]
+    inputs = event_type._abi["inputs"]
+    assert len(params) == len(inputs)
+
+    indexed: List[Tuple[str, type]] = []
+    non_indexed: List[Tuple[str, type]] = []
+    for name, input in zip(params, inputs):
+        if input["indexed"]:
+            indexed.append((name, bytes32 if _is_hashed_topic(input["type"]) else hints[name]))
+        else:
+            non_indexed.append((name, hints[name]))
+    non_indexed_types = [t for _, t in non_indexed]
+
+    def decode(raw) -> E:
+        values = {}
+        for (name, t), topic in zip(indexed, raw.topics[1:]):
+            values[name] = abi.decode(topic, [t])[0]
+        if non_indexed:
+            values.update(zip((name for name, _ in non_indexed), abi.decode(raw.data, non_indexed_types)))
+        event = event_type(**{name: values[name] for name in params})
+        if hasattr(raw, "origin"):
+            object.__setattr__(event, "origin", raw.origin)
+        return event
+
+    _decoders[event_type] = decode
+    return decode
+
+
+def events_of(tx: TransactionAbc, event_type: Type[E], origin: Optional[Union[Account, Address]] = None) -> List[E]:
+    """
+    Events of the given pytypes type emitted in the transaction, e.g.
+    `events_of(tx, SingleTokenVault.Deposited)`.
+
+    Raw logs are filtered by topic0 (the event selector) and only the matching
+    ones are ABI decoded, unlike `tx.events` which decodes every log in the
+    receipt. Results are cached per transaction.
+    """
+    if isinstance(origin, Account):
+        origin = origin.address
+
+    cached = _cache.get(tx)
+    if cached is None:
+        cached = _cache[tx] = {}
+    key = (event_type, origin)
+    try:
+        return cached[key]
+    except KeyError:
+        pass
+
+    selector = event_type.selector
+    decode = _decoder(event_type)
+    events = [
+        decode(raw)
+        for raw in tx.raw_events
+        if len(raw.topics) > 0 and raw.topics[0] == selector
+        and (origin is None or raw.origin.address == origin)
+    ]
+
+    cached[key] = events
+    return events
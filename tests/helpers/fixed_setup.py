@@ -0,0 +1,72 @@
+from typing import Any, Dict, Optional
+
+from wake.testing import random
+from wake.testing.fuzzing import *
+
+from tests.helpers.model import capture_model, restore_model
+
+
+class FixedSetupFuzzTest(FuzzTest):
+    """
+    FuzzTest that deploys once and only re-randomizes at the start of each sequence.
+
+    pre_sequence is split into
+      setup_fixed()    - deployments, owner, approvals; runs once per `run()` before the first sequence
+      setup_sequence() - randomized part (limits, fresh model containers); runs at the start of every sequence
+
+    The fuzzing runner snapshots the chain at the start of each sequence and
+    reverts to it at the end, so with the deployments done before the runner
+    starts, every sequence begins from the post-setup chain state. The Python
+    model built by setup_fixed is captured once and restored before every
+    setup_sequence, so sequence startup does not depend on the deployment size.
+
+    setup_fixed draws from Wake's random seeded with SETUP_SEED, and the
+    random state is restored afterwards. The deployment and the random
+    states Wake records for its sequences (replayed by `-SH`/`-SR`) are
+    therefore the same in every run, whatever the test seed.
+    """
+
+    SETUP_SEED = 0
+
+    _fixed_model: Dict[str, Any]
+    ## set by setup_once, every following run() reuses the deployment
+    _fixed_ready = False
+
+    def setup_fixed(self) -> None:
+        pass
+
+    def setup_sequence(self) -> None:
+        pass
+
+    @classmethod
+    def setup_once(cls, seed: Optional[int] = None) -> None:
+        """
+        Deploys now and lets every following `run()` on the same chain start
+        from this deployment, e.g. in a long-lived worker process. Every run
+        reverts the chain to the post-setup state when it finishes, so the
+        deployment stays valid until a run fails. `seed` replaces SETUP_SEED.
+        """
+        cls._capture_fixed(seed)
+        cls._fixed_ready = True
+
+    @classmethod
+    def _capture_fixed(cls, seed: Optional[int] = None) -> None:
+        state = random.getstate()
+        random.seed(cls.SETUP_SEED if seed is None else seed)
+        try:
+            template = cls()
+            template.setup_fixed()
+        finally:
+            random.setstate(state)
+        cls._fixed_model = capture_model(template)
+
+    @classmethod
+    def run(cls, sequences_count: int, flows_count: int, *args, **kwargs):
+        if not cls._fixed_ready:
+            cls._capture_fixed()
+
+        super().run(sequences_count, flows_count, *args, **kwargs)
+
+    def pre_sequence(self) -> None:
+        restore_model(self, self._fixed_model)
+        self.setup_sequence()
@@ -0,0 +1,61 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+## (sequence, flow number, flow name, tx, args)
+FlowRecord = Tuple[int, int, str, Any, Dict[str, Any]]
+
+
+class FlowLog:
+    """
+    Fixed-size ring buffer of per-flow records, formatted only when dumped.
+
+    `record` stores a tuple referencing the flow's values (transaction object,
+    accounts, ints) without building any string, so logging costs one tuple
+    and one list store per call. Once `capacity` records are stored the oldest
+    ones are overwritten. Transaction hashes and gas are read from the stored
+    transaction objects when the log is formatted.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        assert capacity > 0
+        self.capacity = capacity
+        self._buffer: List[Optional[FlowRecord]] = [None] * capacity
+        self._count = 0
+
+    def record(self, sequence: int, flow_number: int, flow: str, tx: Any = None, **args: Any) -> None:
+        self._buffer[self._count % self.capacity] = (sequence, flow_number, flow, tx, args)
+        self._count += 1
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    @property
+    def dropped(self) -> int:
+        return max(self._count - self.capacity, 0)
+
+    def records(self) -> List[FlowRecord]:
+        ## oldest first
+        if self._count <= self.capacity:
+            return self._buffer[:self._count]
+        start = self._count % self.capacity
+        return self._buffer[start:] + self._buffer[:start]
+
+    def format(self) -> List[str]:
+        lines = []
+        if self.dropped:
+            lines.append(f"... {self.dropped} earlier records dropped")
+        for sequence, flow_number, flow, tx, args in self.records():
+            line = f"sequence {sequence} flow {flow_number} {flow}"
+            if tx is not None:
+                line += f" tx {tx.tx_hash} gas {tx.gas_used}"
+            if args:
+                line += " " + " ".join(f"{name}={_format_value(value)}" for name, value in args.items())
+            lines.append(line)
+        return lines
+
+
+def _format_value(value: Any) -> str:
+    ## accounts and contracts are logged by address
+    if isinstance(value, (list, tuple)):
+        return "[" + ",".join(_format_value(v) for v in value) + "]"
+    address = getattr(value, "address", None)
+    return str(address) if address is not None else str(value)
@@ -0,0 +1,268 @@
+"""
+Per-function gas statistics collected from the transactions of fuzz runs.
+
+Every transaction sent during a profiled run is matched with its receipt and
+recorded under `Contract.function` and a path:
+
+  success / revert - receipt status
+  cold / warm      - first call of the function by the same sender in the
+                     sequence (fresh storage slots, e.g. a first deposit) or a
+                     repeated one
+
+Statistics are stored as JSON in `.wake/gas/` (`latest.json` plus one file per run):
+
+{
+  "version": 1,
+  "functions": {
+    "SingleTokenVault.deposit": {"success/cold": {"count": ..., "min": ..., "mean": ..., "std": ..., "p95": ..., "max": ...}, ...},
+    ...
+  }
+}
+
+Gas of a path usually depends on the random inputs, so a path is compared
+only when its mean moved by more than GAS_SIGNIFICANCE standard errors.
+Compare the last run against the baseline, or store it as the new baseline:
+
+    python -m tests.helpers.gas
+    python -m tests.helpers.gas --save-baseline
+"""
+import argparse
+import json
+import math
+import sys
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import rlp
+
+from tests.helpers.report_paths import report_path
+
+FORMAT_VERSION = 1
+
+GAS_DIR = Path(".wake/gas")
+GAS_BASELINE = Path("benchmarks/gas-baseline.json")
+
+## statistics where an increase is a regression
+GAS_METRICS = ("mean", "p95", "max")
+## standard errors the mean has to grow by, so that other random inputs are not reported
+GAS_SIGNIFICANCE = 3.0
+
+
+def _hex(value: Any) -> str:
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex()
+    return str(value).lower()
+
+
+def _bytes(value: Any) -> bytes:
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return bytes(value or b"")
+
+
+def _int(value: Any) -> int:
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+
+## positions of `to` and `data` in the RLP payload per transaction type
+_RAW_FIELDS = {None: (3, 5), 1: (4, 6), 2: (5, 7)}
+
+
+def decode_raw_transaction(raw: Any) -> Tuple[Optional[str], bytes]:
+    """
+    (to, data) of a signed legacy, EIP-2930 or EIP-1559 transaction.
+    """
+    raw = _bytes(raw)
+    tx_type = None
+    if raw and raw[0] < 0x7f:
+        tx_type, raw = raw[0], raw[1:]
+    to_index, data_index = _RAW_FIELDS.get(tx_type, _RAW_FIELDS[2])
+    fields = rlp.decode(raw)
+    to = fields[to_index]
+    return (_hex(to) if to else None), fields[data_index]
+
+
+class GasStats:
+    def __init__(self):
+        ## gas values repeat a lot, so exact statistics stay small
+        self.values: Counter = Counter()
+
+    def add(self, gas: int) -> None:
+        self.values[gas] += 1
+
+    def to_json(self) -> Dict[str, Any]:
+        count = sum(self.values.values())
+        rank = 0.95 * count
+        seen = 0
+        p95 = 0
+        for gas in sorted(self.values):
+            seen += self.values[gas]
+            if seen >= rank:
+                p95 = gas
+                break
+        mean = sum(gas * n for gas, n in self.values.items()) / count
+        return {
+            "count": count,
+            "min": min(self.values),
+            "mean": mean,
+            "std": math.sqrt(sum((gas - mean) ** 2 * n for gas, n in self.values.items()) / count),
+            "p95": p95,
+            "max": max(self.values),
+        }
+
+
+class GasProfile:
+    """
+    Matches sent transactions with their receipts and aggregates gas per
+    function and path. Contracts must be registered with `track` to get
+    readable names, other transactions are recorded under their address and
+    selector.
+    """
+
+    def __init__(self):
+        self.stats: Dict[str, Dict[str, GasStats]] = defaultdict(lambda: defaultdict(GasStats))
+        self._names: Dict[str, str] = {}
+        self._functions: Dict[Tuple[str, bytes], str] = {}
+        ## tx hash -> (function name, sender)
+        self._pending: Dict[str, Tuple[str, Optional[str]]] = {}
+        self._called: Set[Tuple[str, Optional[str]]] = set()
+
+    def track(self, address: Any, name: str, selectors: Dict[bytes, str]) -> None:
+        address = _hex(address)
+        self._names[address] = name
+        for selector, function in selectors.items():
+            self._functions[(address, selector)] = function
+
+    def new_sequence(self) -> None:
+        self._called.clear()
+        self._pending.clear()
+
+    def _function(self, to: Optional[str], data: bytes) -> str:
+        if to is None:
+            return "deployment"
+        selector = data[:4]
+        name = self._names.get(to, to)
+        return f"{name}.{self._functions.get((to, selector), '0x' + selector.hex())}"
+
+    def sent(self, tx_hash: Any, params: Dict[str, Any]) -> None:
+        to = _hex(params["to"]) if params.get("to") else None
+        sender = _hex(params["from"]) if params.get("from") else None
+        self._pending[_hex(tx_hash)] = (self._function(to, _bytes(params.get("data"))), sender)
+
+    def sent_raw(self, tx_hash: Any, raw: Any) -> None:
+        ## the sender of a signed transaction is not decoded, cold/warm is then tracked per function
+        to, data = decode_raw_transaction(raw)
+        self._pending[_hex(tx_hash)] = (self._function(to, data), None)
+
+    def receipt(self, tx_hash: Any, receipt: Dict[str, Any]) -> None:
+        pending = self._pending.pop(_hex(tx_hash), None)
+        if pending is None:
+            ## already counted, receipts may be polled more than once
+            return
+        function, sender = pending
+        status = "success" if _int(receipt.get("status", 1)) == 1 else "revert"
+        storage = "warm" if pending in self._called else "cold"
+        self._called.add(pending)
+        self.stats[function][f"{status}/{storage}"].add(_int(receipt["gasUsed"]))
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "version": FORMAT_VERSION,
+            "functions": {
+                function: {path: stats.to_json() for path, stats in sorted(paths.items())}
+                for function, paths in sorted(self.stats.items())
+            },
+        }
+
+    def write(self, directory: Path = GAS_DIR) -> Path:
+        directory.mkdir(parents=True, exist_ok=True)
+        report = json.dumps(self.to_json(), indent=2)
+        path = report_path(directory, "gas", ".json")
+        path.write_text(report)
+        (directory / "latest.json").write_text(report)
+        return path
+
+    def summary(self) -> str:
+        lines = [f"{'function':<48} {'path':<14} {'calls':>7} {'min':>9} {'mean':>11} {'p95':>9} {'max':>9}"]
+        for function, paths in self.to_json()["functions"].items():
+            for path, s in paths.items():
+                lines.append(
+                    f"{function:<48} {path:<14} {s['count']:>7} {s['min']:>9} {s['mean']:>11.1f} {s['p95']:>9} {s['max']:>9}"
+                )
+        return "\n".join(lines)
+
+
+def load(path: Path) -> Dict[str, Any]:
+    data = json.loads(path.read_text())
+    assert data["version"] == FORMAT_VERSION, f"unsupported gas report format {data['version']}"
+    return data["functions"]
+
+
+def _significant(old: Dict[str, Any], new: Dict[str, Any], significance: float) -> bool:
+    ## Welch's difference of means, the inputs of two fuzz runs differ even with the same contracts
+    if "std" not in old or "std" not in new:
+        return True
+    error = math.sqrt(old["std"] ** 2 / old["count"] + new["std"] ** 2 / new["count"])
+    return new["mean"] - old["mean"] > significance * error
+
+
+def compare(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    threshold: float = 0.01,
+    significance: float = GAS_SIGNIFICANCE,
+) -> List[str]:
+    """
+    Functions and paths whose mean, p95 or max gas grew by more than
+    `threshold` (relative), one line each. Only paths whose mean grew by more
+    than `significance` standard errors are compared, so a path with
+    constant gas is reported on any growth and a path whose gas depends on
+    the random inputs only when its distribution actually moved.
+    """
+    regressions = []
+    for function, paths in current.items():
+        for path, stats in paths.items():
+            old = baseline.get(function, {}).get(path)
+            if old is None or not _significant(old, stats, significance):
+                continue
+            for metric in GAS_METRICS:
+                if not old.get(metric):
+                    continue
+                change = (stats[metric] - old[metric]) / old[metric]
+                if change > threshold:
+                    regressions.append(f"{function} {path}: {metric} {old[metric]:.0f} -> {stats[metric]:.0f} ({change:+.1%})")
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare the gas report of the last fuzz run with the baseline.")
+    parser.add_argument("--report", type=Path, default=GAS_DIR / "latest.json")
+    parser.add_argument("--baseline", type=Path, default=GAS_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.01)
+    parser.add_argument("--significance", type=float, default=GAS_SIGNIFICANCE, help="standard errors the mean has to grow by")
+    args = parser.parse_args(argv)
+
+    if not args.report.exists():
+        print(f"no gas report at {args.report}, run a profiled fuzz test first")
+        return 1
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(args.report.read_text())
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"no baseline at {args.baseline}, run with --save-baseline first")
+        return 0
+
+    regressions = compare(load(args.baseline), load(args.report), args.threshold, args.significance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
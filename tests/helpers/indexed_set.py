@@ -0,0 +1,56 @@
+from typing import Dict, Generic, Hashable, Iterable, Iterator, List, TypeVar
+
+from wake.testing import random
+
+T = TypeVar("T", bound=Hashable)
+
+
+class IndexedSet(Generic[T]):
+    """
+    Set with O(1) add, discard and uniform random choice.
+
+    Items are kept in a list plus an item -> position map, removal swaps the
+    last item into the freed position. `choice()` draws from Wake's `random`
+    instance, the one seeded by `-S` and restored by the shrinker, so runs
+    reproduce exactly.
+    """
+
+    def __init__(self, items: Iterable[T] = ()):
+        self._items: List[T] = []
+        self._positions: Dict[T, int] = {}
+        for item in items:
+            self.add(item)
+
+    def add(self, item: T) -> None:
+        if item not in self._positions:
+            self._positions[item] = len(self._items)
+            self._items.append(item)
+
+    def discard(self, item: T) -> None:
+        position = self._positions.pop(item, None)
+        if position is None:
+            return
+        last = self._items.pop()
+        if position < len(self._items):
+            self._items[position] = last
+            self._positions[last] = position
+
+    def choice(self) -> T:
+        if not self._items:
+            raise IndexError("choice from an empty IndexedSet")
+        return self._items[random.randrange(len(self._items))]
+
+    def __contains__(self, item: object) -> bool:
+        return item in self._positions
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self._items)
+
+    def __copy_model__(self) -> "IndexedSet[T]":
+        copied = IndexedSet()
+        copied._items = list(self._items)
+        copied._positions = dict(self._positions)
+        return copied
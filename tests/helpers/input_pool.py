@@ -0,0 +1,93 @@
+from typing import Dict, List, Sequence
+
+from wake.testing import random
+
+UINT256_MAX = 2**256 - 1
+
+
+class IntPool:
+    """
+    Pre-generated random integers for one flow parameter.
+
+    Raw 256-bit values and boundary decisions are generated `block_size` at a
+    time with two `random.getrandbits` calls and mapped into the requested
+    range on each draw, so a draw is a couple of list lookups and a modulo
+    instead of a `random_int` call. Blocks come from Wake's `random` instance
+    seeded by `-S`, so replaying a whole sequence stays bit-exact.
+
+    Call `InputPools.new_flow()` at the start of every flow (in pre_flow):
+    it drops the buffered blocks, so every flow refills from the random
+    state at its start and the values it draws depend on that state only.
+    Wake's `-SH` shrinker and `-SR` replay restore exactly that state before
+    pre_flow, so they reproduce the draws of the original run. Blocks are
+    kept small for this reason, a flow rarely draws more than a few values
+    of one parameter.
+
+    With probability `boundary_prob` a draw returns one of the given
+    boundary values instead (0, min, max, max + 1, 2**256 - 1, ...), which may
+    lie outside [low, high] to hit revert paths on purpose. The modulo
+    mapping has a bias of at most (high - low) / 2**256, negligible for the
+    ranges used in the tests.
+    """
+
+    def __init__(self, block_size: int = 8, boundary_prob: float = 0.05):
+        self.block_size = block_size
+        ## boundary decisions are stored as bytes, a byte below the threshold selects a boundary value
+        self._threshold = round(boundary_prob * 256)
+        self._values: List[int] = []
+        self._kinds: bytes = b""
+        self._position = block_size
+
+    def _refill(self) -> None:
+        raw = random.getrandbits(256 * self.block_size).to_bytes(32 * self.block_size, "big")
+        self._values = [int.from_bytes(raw[i:i + 32], "big") for i in range(0, len(raw), 32)]
+        self._kinds = random.getrandbits(8 * self.block_size).to_bytes(self.block_size, "big")
+        self._position = 0
+
+    def draw(self, low: int, high: int, boundaries: Sequence[int] = ()) -> int:
+        if self._position == self.block_size:
+            self._refill()
+        value = self._values[self._position]
+        kind = self._kinds[self._position]
+        self._position += 1
+
+        if boundaries and kind < self._threshold:
+            return boundaries[value % len(boundaries)]
+        return low + value % (high - low + 1)
+
+    def __copy_model__(self) -> "IntPool":
+        copied = IntPool(self.block_size)
+        copied._threshold = self._threshold
+        copied._values = self._values
+        copied._kinds = self._kinds
+        copied._position = self._position
+        return copied
+
+
+class InputPools:
+    """
+    One IntPool per flow parameter name, created on first use, e.g.
+    `self.inputs["deposit.amount"].draw(min_amount, max_amount)`.
+    """
+
+    def __init__(self, block_size: int = 8, boundary_prob: float = 0.05):
+        self.block_size = block_size
+        self.boundary_prob = boundary_prob
+        self._pools: Dict[str, IntPool] = {}
+
+    def __getitem__(self, name: str) -> IntPool:
+        try:
+            return self._pools[name]
+        except KeyError:
+            pool = self._pools[name] = IntPool(self.block_size, self.boundary_prob)
+            return pool
+
+    def new_flow(self) -> None:
+        ## unconsumed values are discarded, they were drawn from the random state of an earlier flow
+        for pool in self._pools.values():
+            pool._position = pool.block_size
+
+    def __copy_model__(self) -> "InputPools":
+        copied = InputPools(self.block_size, self.boundary_prob)
+        copied._pools = {name: pool.__copy_model__() for name, pool in self._pools.items()}
+        return copied
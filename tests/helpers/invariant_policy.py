@@ -0,0 +1,37 @@
+import random
+
+EVERY_FLOW = "every_flow"
+PROBABILISTIC = "probabilistic"
+END_OF_SEQUENCE = "end_of_sequence"
+
+MODES = (EVERY_FLOW, PROBABILISTIC, END_OF_SEQUENCE)
+
+
+class InvariantPolicy:
+    """
+    Decides after which flows the invariants are checked.
+
+      EVERY_FLOW      - after every flow
+      PROBABILISTIC   - after a flow with probability `probability`
+      END_OF_SEQUENCE - never during the sequence, only the end-of-sequence check
+
+    Checking every N flows is left to Wake's `@invariant(period=N)`.
+
+    Probabilistic sampling draws from its own `random.Random(seed)`, so the
+    flows and their inputs drawn from Wake's `random` are the same under
+    every policy and a failing `-S` seed reproduces under each of them.
+    """
+
+    def __init__(self, mode: str = EVERY_FLOW, probability: float = 0.1, seed: int = 0):
+        assert mode in MODES, f"unknown invariant policy {mode}"
+        self.mode = mode
+        self.probability = probability
+        self._random = random.Random(seed)
+
+    def due(self) -> bool:
+        ## called once per flow, right before its invariants would run
+        if self.mode == EVERY_FLOW:
+            return True
+        if self.mode == PROBABILISTIC:
+            return self._random.random() < self.probability
+        return False
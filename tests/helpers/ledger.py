@@ -0,0 +1,111 @@
+from typing import Dict, Generic, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from tests.helpers.indexed_set import IndexedSet
+
+K = TypeVar("K", bound=Hashable)
+
+
+class Ledger(Generic[K]):
+    """
+    Shadow balances of accounts interned to dense indices.
+
+    Balances live in one list indexed by the interned account index (Python
+    ints, so full uint256 range), which keeps model updates to a dict lookup
+    plus a list store and lets invariants compare the whole ledger with a
+    batched chain read in one list comparison. Unknown accounts read as 0 like
+    `defaultdict(int)`; iteration order is interning order.
+
+    With `track_positive=True`, `positive` is kept in sync with every update
+    and holds the accounts with a balance > 0, for O(1) sampling of eligible
+    accounts in flows. Otherwise it is None and updates skip the bookkeeping.
+    """
+
+    def __init__(self, track_positive: bool = False):
+        self._index: Dict[K, int] = {}
+        self.keys: List[K] = []
+        self.balances: List[int] = []
+        self.positive: Optional[IndexedSet[K]] = IndexedSet() if track_positive else None
+
+    def index(self, key: K) -> int:
+        try:
+            return self._index[key]
+        except KeyError:
+            i = self._index[key] = len(self.keys)
+            self.keys.append(key)
+            self.balances.append(0)
+            return i
+
+    def __getitem__(self, key: K) -> int:
+        i = self._index.get(key)
+        return 0 if i is None else self.balances[i]
+
+    def __setitem__(self, key: K, value: int) -> None:
+        self.balances[self.index(key)] = value
+        if self.positive is None:
+            return
+        if value > 0:
+            self.positive.add(key)
+        else:
+            self.positive.discard(key)
+
+    def get(self, key: K, default: int = 0) -> int:
+        i = self._index.get(key)
+        return default if i is None else self.balances[i]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __iter__(self) -> Iterator[K]:
+        return iter(self.keys)
+
+    def items(self) -> Iterator[Tuple[K, int]]:
+        return zip(self.keys, self.balances)
+
+    def values(self) -> List[int]:
+        return self.balances
+
+    def apply(self, deltas: Iterable[Tuple[K, int]]) -> None:
+        ## bulk update, e.g. [(user, -amount), (vault, amount)]
+        balances = self.balances
+        positive = self.positive
+        for key, delta in deltas:
+            i = self.index(key)
+            balances[i] += delta
+            if positive is None:
+                continue
+            if balances[i] > 0:
+                positive.add(key)
+            else:
+                positive.discard(key)
+
+    def mismatches(self, actual: Sequence[int], keys: Optional[Sequence[K]] = None) -> List[Tuple[K, int, int]]:
+        """
+        (key, expected, actual) for every entry differing from `actual`.
+
+        `actual` holds chain values for `keys`, or for the whole ledger in index
+        order when `keys` is None. The common all-equal case is a single list
+        comparison.
+        """
+        if keys is None:
+            keys = self.keys
+            expected = self.balances
+        else:
+            balances = self.balances
+            index = self._index
+            expected = [balances[index[key]] if key in index else 0 for key in keys]
+
+        assert len(actual) == len(expected)
+        if expected == list(actual):
+            return []
+        return [(key, e, a) for key, e, a in zip(keys, expected, actual) if e != a]
+
+    def __copy_model__(self) -> "Ledger[K]":
+        copied = Ledger()
+        copied._index = dict(self._index)
+        copied.keys = list(self.keys)
+        copied.balances = list(self.balances)
+        copied.positive = self.positive.__copy_model__() if self.positive is not None else None
+        return copied
@@ -0,0 +1,66 @@
+from pathlib import Path
+from typing import Any, Optional
+
+from wake.testing import *
+from wake.testing.fuzzing import *
+
+from tests.helpers.flow_log import FlowLog
+from tests.helpers.report_paths import report_path
+
+
+class LoggedFuzzTest(FuzzTest):
+    """
+    FuzzTest keeping structured flow records in an in-memory ring buffer.
+
+    Flows call `self.log("deposit", tx, user=user, amount=amount)` instead of
+    formatting a log message. Nothing is formatted or written on a clean run;
+    when a flow or invariant fails, the last FLOW_LOG_SIZE records are written
+    to FLOW_LOG_DIR (next to the crash logs) and the exception is re-raised.
+
+    Subclasses overriding pre_sequence or pre_flow must call super().
+    """
+
+    FLOW_LOG_SIZE = 1000
+    FLOW_LOG_DIR = Path(".wake/logs/crashes")
+
+    ## kept on the class, so that it is not part of the Python model and outlives a failed sequence
+    _flow_log: Optional[FlowLog] = None
+    _sequence_number = -1
+    _flow_number = -1
+
+    @classmethod
+    def run(cls, sequences_count: int, flows_count: int, *args, **kwargs):
+        cls._flow_log = FlowLog(cls.FLOW_LOG_SIZE)
+        cls._sequence_number = -1
+        try:
+            super().run(sequences_count, flows_count, *args, **kwargs)
+        except Exception as e:
+            path = cls._write_flow_log(e)
+            print("")
+            print(f"last {len(cls._flow_log)} flow records written to {path}")
+            raise
+        finally:
+            cls._flow_log = None
+
+    def pre_sequence(self):
+        cls = type(self)
+        cls._sequence_number += 1
+        cls._flow_number = -1
+        super().pre_sequence()
+
+    def pre_flow(self, flow):
+        type(self)._flow_number += 1
+        super().pre_flow(flow)
+
+    def log(self, event: str, tx: Any = None, **args: Any) -> None:
+        if self._flow_log is not None:
+            self._flow_log.record(self._sequence_number, self._flow_number, event, tx, **args)
+
+    @classmethod
+    def _write_flow_log(cls, error: Exception) -> Path:
+        cls.FLOW_LOG_DIR.mkdir(parents=True, exist_ok=True)
+        path = report_path(cls.FLOW_LOG_DIR, "flows", ".log")
+        lines = cls._flow_log.format()
+        lines.append(f"failed with {error!r}")
+        path.write_text("\n".join(lines) + "\n")
+        return path
@@ -0,0 +1,40 @@
+from collections import defaultdict
+from typing import Any, Dict
+
+
+def copy_model(value: Any) -> Any:
+    """
+    Copies the Python model of a fuzz test.
+
+    Built-in containers (dict, defaultdict, list, set, tuple) are copied
+    recursively, objects defining `__copy_model__()` copy themselves and
+    everything else (accounts, contracts, ints, helper objects) is shared by
+    reference. Accounts and contracts are handles to the live chain
+    and cannot be pickled, so a copy is taken instead of a pickle; helpers
+    holding their own mutable state must be recreated after a restore.
+    """
+    if hasattr(value, "__copy_model__"):
+        return value.__copy_model__()
+    if isinstance(value, defaultdict):
+        copied = defaultdict(value.default_factory)
+        for k, v in value.items():
+            copied[k] = copy_model(v)
+        return copied
+    if isinstance(value, dict):
+        return {k: copy_model(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [copy_model(v) for v in value]
+    if isinstance(value, set):
+        return set(value)
+    if isinstance(value, tuple):
+        return tuple(copy_model(v) for v in value)
+    return value
+
+
+def capture_model(obj: Any) -> Dict[str, Any]:
+    return copy_model(vars(obj))
+
+
+def restore_model(obj: Any, model: Dict[str, Any]) -> None:
+    ## copy again so that the captured model can be restored any number of times
+    vars(obj).update(copy_model(model))
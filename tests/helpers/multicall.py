@@ -0,0 +1,50 @@
+from typing import Any, Callable, List, Sequence, Tuple, Type
+
+from wake.testing import *
+
+from pytypes.tests.helpers.Multicall import Multicall
+
+## (view function of a pytypes contract, arguments) or (view function, arguments, return type)
+ViewCall = Tuple[Any, ...]
+
+
+class BatchReader:
+    """
+    Reads many view functions with a single `eth_call` through the Multicall helper contract.
+
+    reader = BatchReader.deploy()
+    balance, min_amount = reader.read([
+        (vault.balanceOf, [user.address]),
+        (vault.minDepositAmount, []),
+    ])
+    """
+
+    multicall: Multicall
+
+    def __init__(self, multicall: Multicall):
+        self.multicall = multicall
+
+    @classmethod
+    def deploy(cls, **kwargs) -> "BatchReader":
+        return cls(Multicall.deploy(**kwargs))
+
+    def read(self, calls: Sequence[ViewCall]) -> List[Any]:
+        if len(calls) == 0:
+            return []
+
+        return_types: List[Type] = []
+        encoded: List[Multicall.Call] = []
+        for call in calls:
+            fn: Callable = call[0]
+            args = list(call[1]) if len(call) > 1 else []
+            ## all vault and token view functions used by the tests return uint256
+            return_types.append(call[2] if len(call) > 2 else uint256)
+            encoded.append(Multicall.Call(target=fn.__self__.address, callData=abi.encode_call(fn, args)))
+
+        results = self.multicall.aggregate(encoded)
+
+        decoded = []
+        for call, result, return_type in zip(calls, results, return_types):
+            assert result.success, f"batched call {call[0].__name__} reverted"
+            decoded.append(abi.decode(result.returnData, [return_type])[0])
+        return decoded
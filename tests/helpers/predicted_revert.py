@@ -0,0 +1,31 @@
+import os
+from typing import Any, Callable, Optional
+
+from wake.testing import *
+
+## WAKE_PROMOTE_REVERTS=1 sends predicted reverts as real transactions, e.g. for a spot-check run
+PROMOTE_PREDICTED_REVERTS = os.environ.get("WAKE_PROMOTE_REVERTS", "0") == "1"
+
+
+def must_revert_call(error: Any, fn: Callable, *args, from_: Account, promote: Optional[bool] = None, **kwargs):
+    """
+    Checks that a call the Python model predicts to revert does revert with `error`.
+
+    The call is executed as a dry-run `eth_call` from `from_`, so no block is
+    mined and no receipt is fetched, and the decoded custom error is matched
+    the same way as `must_revert` does, e.g.
+
+    must_revert_call(Token.NotAuthorized(caller.address), token.mintTokens, to, 1000, from_=caller)
+
+    With `promote` (default PROMOTE_PREDICTED_REVERTS) a real transaction is sent instead.
+    Returns the raised error.
+    """
+    if promote is None:
+        promote = PROMOTE_PREDICTED_REVERTS
+
+    with must_revert(error) as e:
+        if promote:
+            fn(*args, from_=from_, **kwargs)
+        else:
+            fn(*args, from_=from_, request_type="call", **kwargs)
+    return e.value
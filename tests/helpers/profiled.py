@@ -0,0 +1,115 @@
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from wake.testing import *
+from wake.testing.fuzzing import *
+
+from tests.helpers import gas
+from tests.helpers.profiler import FuzzProfiler
+
+
+class ProfiledFuzzTest(FuzzTest):
+    """
+    FuzzTest recording per-flow and per-invariant profiles.
+
+    At the end of the run a JSON report is written to PROFILE_DIR (next to the
+    crash logs) and a summary table is printed. Other parts of a test (e.g.
+    batched chain reads) can be profiled with `with self.profiled("name"):`.
+
+    Gas of every transaction is aggregated per function (see tests/helpers/gas.py)
+    and written to GAS_DIR; contracts registered with `track_gas` get readable
+    function names. When GAS_BASELINE exists, functions whose gas grew by more
+    than GAS_THRESHOLD are printed as regressions.
+
+    Subclasses overriding pre_sequence or the pre_/post_ flow and invariant hooks must call super().
+    """
+
+    PROFILE = True
+    PROFILE_DIR = Path(".wake/logs/profiles")
+    GAS_DIR = gas.GAS_DIR
+    GAS_BASELINE = gas.GAS_BASELINE
+    GAS_THRESHOLD = 0.01
+
+    _profiler: Optional[FuzzProfiler] = None
+    ## profile of the last finished run, e.g. for benchmarks
+    last_profile: Optional[FuzzProfiler] = None
+
+    @classmethod
+    def run(cls, sequences_count: int, flows_count: int, *args, **kwargs):
+        if not cls.PROFILE:
+            return super().run(sequences_count, flows_count, *args, **kwargs)
+
+        profiler = FuzzProfiler()
+        profiler.install(chain.chain_interface)
+        cls._profiler = profiler
+        try:
+            super().run(sequences_count, flows_count, *args, **kwargs)
+        finally:
+            profiler.stop()
+            profiler.uninstall()
+            cls._profiler = None
+            cls.last_profile = profiler
+            path = profiler.write(cls.PROFILE_DIR)
+            print("")
+            print(profiler.summary())
+            print(f"profile written to {path}")
+            cls._report_gas(profiler.gas)
+
+    @classmethod
+    def _report_gas(cls, profile: gas.GasProfile):
+        path = profile.write(cls.GAS_DIR)
+        print("")
+        print(profile.summary())
+        print(f"gas report written to {path}")
+        if cls.GAS_BASELINE.exists():
+            for line in gas.compare(gas.load(cls.GAS_BASELINE), profile.to_json()["functions"], cls.GAS_THRESHOLD):
+                print(f"GAS REGRESSION {line}")
+
+    def track_gas(self, *contracts: Account) -> None:
+        ## names gas statistics as Contract.function instead of address.selector
+        if self._profiler is None:
+            return
+        for contract in contracts:
+            selectors = {
+                selector: item["name"]
+                for selector, item in type(contract)._abi.items()
+                if isinstance(selector, bytes) and item.get("type") == "function"
+            }
+            self._profiler.gas.track(contract.address, type(contract).__name__, selectors)
+
+    def pre_sequence(self):
+        if self._profiler is not None:
+            self._profiler.gas.new_sequence()
+        super().pre_sequence()
+
+    @contextmanager
+    def profiled(self, name: str):
+        if self._profiler is None:
+            yield
+            return
+        self._profiler.start("sections", name)
+        try:
+            yield
+        finally:
+            self._profiler.stop()
+
+    def pre_flow(self, flow):
+        super().pre_flow(flow)
+        if self._profiler is not None:
+            self._profiler.start("flows", flow.__name__)
+
+    def post_flow(self, flow):
+        if self._profiler is not None:
+            self._profiler.stop()
+        super().post_flow(flow)
+
+    def pre_invariant(self, invariant):
+        super().pre_invariant(invariant)
+        if self._profiler is not None:
+            self._profiler.start("invariants", invariant.__name__)
+
+    def post_invariant(self, invariant):
+        if self._profiler is not None:
+            self._profiler.stop()
+        super().post_invariant(invariant)
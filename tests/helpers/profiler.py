@@ -0,0 +1,174 @@
+import inspect
+import json
+import math
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from tests.helpers.gas import GasProfile
+from tests.helpers.report_paths import report_path
+
+## methods of the chain interface that send a transaction
+_SEND_METHODS = ("send_transaction", "send_raw_transaction")
+
+
+class Histogram:
+    """
+    Log-bucketed wall time histogram, constant memory regardless of the sample count.
+
+    Buckets grow by 10 %, so percentiles are accurate to ~10 %; count, total and max are exact.
+    """
+
+    _BASE = 1.1
+    _MIN = 1e-6
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = defaultdict(int)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[int(math.log(max(seconds, self._MIN) / self._MIN, self._BASE))] += 1
+
+    def percentile(self, p: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = p * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self._MIN * self._BASE ** (bucket + 1), self.max)
+        return self.max
+
+
+class SectionStats:
+    def __init__(self):
+        self.time = Histogram()
+        self.rpc_calls = 0
+        self.rpc_time = 0.0
+        self.transactions = 0
+        self.gas_used = 0
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "calls": self.time.count,
+            "total_s": self.time.total,
+            "p50_s": self.time.percentile(0.5),
+            "p95_s": self.time.percentile(0.95),
+            "max_s": self.time.max,
+            "rpc_calls": self.rpc_calls,
+            "rpc_s": self.rpc_time,
+            "transactions": self.transactions,
+            "gas_used": self.gas_used,
+        }
+
+
+class FuzzProfiler:
+    """
+    Per-flow and per-invariant call count, wall time histogram, RPC calls,
+    transactions sent and gas used.
+
+    RPC calls are counted by wrapping the public methods of the chain interface
+    on `install()`; transactions are the send calls and gas is taken from the
+    receipts Wake fetches anyway, so profiling adds no RPC calls of its own.
+    Gas of every transaction, inside a section or not, is also aggregated per
+    function in `gas`.
+    """
+
+    def __init__(self):
+        self.sections: Dict[Tuple[str, str], SectionStats] = defaultdict(SectionStats)
+        self._current: Optional[SectionStats] = None
+        self._started = 0.0
+        self._receipts: Set[Any] = set()
+        self._interface: Any = None
+        self._wrapped: List[str] = []
+        self.gas = GasProfile()
+
+    def install(self, chain_interface: Any) -> None:
+        self._interface = chain_interface
+        for name, _ in inspect.getmembers(type(chain_interface), inspect.isfunction):
+            if name.startswith("_"):
+                continue
+            setattr(chain_interface, name, self._wrap(name, getattr(chain_interface, name)))
+            self._wrapped.append(name)
+
+    def uninstall(self) -> None:
+        for name in self._wrapped:
+            delattr(self._interface, name)
+        self._wrapped.clear()
+        self._interface = None
+
+    def _wrap(self, name: str, method: Callable) -> Callable:
+        is_send = name in _SEND_METHODS
+        is_receipt = name == "get_transaction_receipt"
+
+        def wrapper(*args, **kwargs):
+            section = self._current
+            start = time.perf_counter()
+            ret = method(*args, **kwargs)
+            elapsed = time.perf_counter() - start
+
+            if name == "send_transaction":
+                self.gas.sent(ret, args[0])
+            elif name == "send_raw_transaction":
+                self.gas.sent_raw(ret, args[0])
+            elif is_receipt and ret is not None and args:
+                self.gas.receipt(args[0], ret)
+
+            if section is None:
+                return ret
+            section.rpc_time += elapsed
+            section.rpc_calls += 1
+
+            if is_send:
+                section.transactions += 1
+            elif is_receipt and ret is not None and args and args[0] not in self._receipts:
+                ## receipts may be polled more than once, count gas once per tx
+                self._receipts.add(args[0])
+                gas = ret["gasUsed"]
+                section.gas_used += int(gas, 16) if isinstance(gas, str) else gas
+            return ret
+
+        return wrapper
+
+    def start(self, kind: str, name: str) -> None:
+        self._current = self.sections[(kind, name)]
+        self._receipts.clear()
+        self._started = time.perf_counter()
+
+    def stop(self) -> None:
+        if self._current is not None:
+            self._current.time.add(time.perf_counter() - self._started)
+            self._current = None
+
+    def to_json(self) -> Dict[str, Any]:
+        report: Dict[str, Any] = {"flows": {}, "invariants": {}, "sections": {}}
+        for (kind, name), stats in sorted(self.sections.items()):
+            report[kind][name] = stats.to_json()
+        return report
+
+    def write(self, directory: Path) -> Path:
+        directory.mkdir(parents=True, exist_ok=True)
+        path = report_path(directory, "profile", ".json")
+        path.write_text(json.dumps(self.to_json(), indent=2))
+        return path
+
+    def summary(self) -> str:
+        lines = [
+            f"{'section':<40} {'calls':>8} {'total s':>9} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'rpc':>8} {'txs':>7} {'gas':>12}"
+        ]
+        for (kind, name), stats in sorted(self.sections.items(), key=lambda item: -item[1].time.total):
+            t = stats.time
+            lines.append(
+                f"{kind[:-1] + ' ' + name:<40} {t.count:>8} {t.total:>9.2f} {t.percentile(0.5) * 1000:>8.2f} "
+                f"{t.percentile(0.95) * 1000:>8.2f} {t.max * 1000:>8.2f} {stats.rpc_calls:>8} "
+                f"{stats.transactions:>7} {stats.gas_used:>12}"
+            )
+        return "\n".join(lines)
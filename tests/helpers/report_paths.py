@@ -0,0 +1,15 @@
+import itertools
+import os
+import time
+from pathlib import Path
+
+_counter = itertools.count()
+
+
+def report_path(directory: Path, prefix: str, suffix: str) -> Path:
+    """
+    `<directory>/<prefix>-<timestamp>-<pid>-<n><suffix>`, unique across the
+    runs of one process and across processes writing into the same directory
+    (worker pools, parallel `wake test -P`) within the same second.
+    """
+    return directory / f"{prefix}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_counter)}{suffix}"
@@ -0,0 +1,118 @@
+import json
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Generic, Iterator, List, Optional, TypeVar
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class SpillLog:
+    """
+    Append-only JSON-lines log of evicted entries, looked up by key.
+
+    Nothing but the open file is kept in memory, so a lookup scans the log;
+    it is meant for crash reports, not for the hot path.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "a", buffering=1 << 16)
+        self.count = 0
+
+    def write(self, key: str, record: Dict[str, Any]) -> None:
+        self._file.write(json.dumps({"key": key, **record}, separators=(",", ":"), default=str) + "\n")
+        self.count += 1
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        self._file.flush()
+        found = None
+        with open(self.path) as f:
+            for line in f:
+                ## cheap prefilter before parsing, the last record of a key wins
+                if key in line:
+                    record = json.loads(line)
+                    if record["key"] == key:
+                        found = record
+        return found
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class RetentionWindow(Generic[K, V]):
+    """
+    Dict-like store keeping the last `capacity` inserted entries.
+
+    Inserting beyond the capacity evicts the oldest entry and passes it to
+    `spill` (e.g. to write a compact record to a SpillLog). With
+    `capacity=None` nothing is evicted and it behaves like a plain dict.
+    """
+
+    def __init__(self, capacity: Optional[int] = None, spill: Optional[Callable[[K, V], None]] = None):
+        assert capacity is None or capacity > 0
+        self.capacity = capacity
+        self.spill = spill
+        self.evicted = 0
+        self._entries: "OrderedDict[K, V]" = OrderedDict()
+
+    def __setitem__(self, key: K, value: V) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if self.capacity is not None and len(self._entries) > self.capacity:
+            old_key, old_value = self._entries.popitem(last=False)
+            self.evicted += 1
+            if self.spill is not None:
+                self.spill(old_key, old_value)
+
+    def __getitem__(self, key: K) -> V:
+        return self._entries[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[K]:
+        return iter(self._entries)
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        return self._entries.get(key, default)
+
+    def values(self):
+        return self._entries.values()
+
+
+def trim_history(
+    order: List[K],
+    entries: Dict[K, V],
+    capacity: int,
+    spill: Optional[Callable[[K, Optional[V]], None]] = None,
+    key: Callable[[K], K] = lambda k: k,
+) -> int:
+    """
+    Trims a history kept as a list of keys (oldest first) plus a dict of the
+    entries loaded so far, e.g. the sent transaction hashes and the cache of
+    transaction objects. The oldest keys are removed until at most `capacity`
+    are left, each together with its entry (None if it was never loaded),
+    and passed to `spill`. Once there are more than `capacity` entries, those
+    whose key is no longer in `order` are removed as well. `key` maps an item of `order` to its key in `entries`.
+    Returns the number of keys removed from `order`.
+    """
+    removed = max(len(order) - capacity, 0)
+    evicted = order[:removed]
+    del order[:removed]
+    for k in evicted:
+        value = entries.pop(key(k), None)
+        if spill is not None:
+            spill(k, value)
+
+    if len(entries) > capacity:
+        retained = {key(k) for k in order}
+        for k in [k for k in entries if k not in retained]:
+            value = entries.pop(k)
+            if spill is not None:
+                spill(k, value)
+    return removed
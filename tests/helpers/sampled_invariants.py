@@ -0,0 +1,138 @@
+import functools
+import inspect
+import time
+from typing import Callable, Dict
+
+from wake.testing import *
+from wake.testing.fuzzing import *
+
+from tests.helpers.checkpoints import CheckpointedFuzzTest
+from tests.helpers.invariant_policy import EVERY_FLOW, InvariantPolicy
+
+
+class SampledInvariantsFuzzTest(CheckpointedFuzzTest):
+    """
+    FuzzTest checking invariants according to an InvariantPolicy (every
+    flow, with INVARIANT_PROBABILITY or only at the end of the sequence), on
+    top of the periods of Wake's `@invariant(period=N)`.
+
+    Every `@invariant` is wrapped and returns immediately for flows the policy
+    skips, pre_invariant and post_invariant are not passed on for them, so
+    profiling and logging only see the checks that ran. `invariants_due`
+    tells subclasses whether any invariant runs for the current flow, e.g. to
+    skip reading chain state in pre_invariants. The invariants always run in
+    post_sequence.
+
+    When a sampled or periodic check fails, the flows since the last passing
+    check of that invariant are replayed from the nearest checkpoint with
+    invariants checked after every flow (checkpoints are taken whenever a
+    check can be bisected this way). The first violating flow is
+    reported, and checkpoint shrinking (if enabled) starts from that flow
+    instead of the sampled one.
+
+    Subclasses overriding pre_/post_ sequence and invariants hooks must call super().
+    """
+
+    INVARIANT_POLICY = EVERY_FLOW
+    INVARIANT_PROBABILITY = 0.1
+    INVARIANT_SEED = 0
+
+    _policy: InvariantPolicy
+    ## periods of the invariants, by name
+    _periods: Dict[str, int]
+    invariants_due: bool = True
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for name, fn in list(vars(cls).items()):
+            if callable(fn) and hasattr(fn, "invariant") and not hasattr(fn, "__sampled__"):
+                setattr(cls, name, cls._wrap_invariant(name, fn))
+
+    @staticmethod
+    def _wrap_invariant(name: str, fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(self):
+            if not self.invariants_due:
+                return None
+            ## also set when called directly, e.g. from post_sequence
+            self._step = ("invariant", name)
+            return fn(self)
+
+        wrapper.__sampled__ = True
+        return wrapper
+
+    @classmethod
+    def run(cls, sequences_count: int, flows_count: int, *args, **kwargs):
+        cls._policy = InvariantPolicy(cls.INVARIANT_POLICY, cls.INVARIANT_PROBABILITY, cls.INVARIANT_SEED)
+        cls._periods = {name: getattr(fn, "period", 1) for name, fn in inspect.getmembers(cls) if hasattr(fn, "invariant")}
+        super().run(sequences_count, flows_count, *args, **kwargs)
+
+    def pre_sequence(self):
+        self.invariants_due = True
+        ## number of recorded flow calls at the last passing check of each invariant
+        self._last_passed: Dict[str, int] = {}
+        super().pre_sequence()
+
+    def pre_invariants(self):
+        ## Wake counts the periods from the first flow of the sequence, replays for bisection and shrinking count their own
+        due = self._policy.due()
+        self.invariants_due = self._recording.replaying or (
+            due and any(self._flow_num % period == 0 for period in self._periods.values())
+        )
+        super().pre_invariants()
+
+    def pre_invariant(self, invariant):
+        if self.invariants_due:
+            super().pre_invariant(invariant)
+
+    def post_invariant(self, invariant):
+        if not self.invariants_due:
+            return
+        super().post_invariant(invariant)
+        if not self._recording.replaying:
+            self._last_passed[invariant.__name__] = len(self._recording.calls)
+
+    def post_sequence(self):
+        self.invariants_due = True
+        super().post_sequence()
+
+    def _bisects(self, name: str) -> bool:
+        ## a failing check may have skipped the flow that broke the invariant
+        return self._policy.mode != EVERY_FLOW or self._periods.get(name, 1) > 1
+
+    def _takes_checkpoints(self) -> bool:
+        return super()._takes_checkpoints() or any(self._bisects(name) for name in self._periods)
+
+    def on_failure(self, error: Exception) -> None:
+        kind, name = self._step
+        if kind == "invariant" and self._bisects(name):
+            self._bisect()
+        super().on_failure(error)
+
+    def _bisect(self) -> None:
+        recording = self._recording
+        recording.replaying = True
+        recording.every_flow = True
+        failed_step = self._step
+        failed_after = len(recording.calls) - 1
+        checkpoint = self._checkpoint_before(self._last_passed.get(failed_step[1], 0))
+
+        start = time.perf_counter()
+        self._restore(checkpoint)
+        failure = self._replay(recording.calls, [True] * len(recording.calls), checkpoint.index)
+        elapsed = time.perf_counter() - start
+
+        print("")
+        if failure is None:
+            self._step = failed_step
+            recording.every_flow = False
+            print(f"sampled invariant failure after flow #{failed_after} not reproduced with per-flow checks")
+            return
+
+        ## the shrinker only needs the flows up to the first violation, and checks after every flow as well
+        index = failure[0]
+        recording.calls = recording.calls[:index + 1]
+        kind, name = self._step
+        print(f"sampled invariant check failed after flow #{failed_after}, "
+              f"first failing {kind} {name} at flow #{index} {recording.calls[index].name} "
+              f"(replayed {failed_after - checkpoint.index + 1} flows from #{checkpoint.index} in {elapsed:.1f}s)")
@@ -0,0 +1,66 @@
+from collections import Counter
+from typing import Dict, Hashable, List, Optional, Tuple
+
+SKIPPED = "skipped"
+REVERTED = "reverted"
+SUCCEEDED = "succeeded"
+NEW_STATE = "new_state"
+
+OUTCOMES = (SKIPPED, REVERTED, SUCCEEDED, NEW_STATE)
+
+## how much each outcome is worth when reweighting a flow
+REWARDS = {SKIPPED: 0.0, REVERTED: 0.5, SUCCEEDED: 1.0, NEW_STATE: 2.0}
+
+
+class AdaptiveScheduler:
+    """
+    Online flow reweighting from observed outcomes.
+
+    Each flow keeps an exponential moving average of the rewards of its
+    outcomes (starting at 1.0, the reward of a plain success), its weight is
+    `declared weight * average`, clamped to `bounds` (multipliers of the
+    declared weight, per flow name or default). The update is deterministic
+    and the scheduler draws nothing itself: the weights are written back to
+    the flows and Wake draws from them with its own seeded RNG, so runs stay
+    reproducible from the `-S` seed.
+    """
+
+    def __init__(
+        self,
+        weights: Dict[str, float],
+        bounds: Tuple[float, float] = (0.25, 4.0),
+        flow_bounds: Optional[Dict[str, Tuple[float, float]]] = None,
+        alpha: float = 0.05,
+    ):
+        self.declared = dict(weights)
+        self.weights = dict(weights)
+        self.bounds = {name: (flow_bounds or {}).get(name, bounds) for name in weights}
+        self.alpha = alpha
+        self.scores = {name: 1.0 for name in weights}
+        self.outcomes: Dict[str, Counter] = {name: Counter() for name in weights}
+        self.seen_states: set = set()
+
+    def outcome(self, ret: object, state: Optional[Hashable]) -> str:
+        ## flows skip by returning a reason string
+        if isinstance(ret, str):
+            return SKIPPED
+        if state is not None and state not in self.seen_states:
+            self.seen_states.add(state)
+            return NEW_STATE
+        return SUCCEEDED
+
+    def record(self, name: str, outcome: str) -> float:
+        self.outcomes[name][outcome] += 1
+        score = (1 - self.alpha) * self.scores[name] + self.alpha * REWARDS[outcome]
+        self.scores[name] = score
+
+        low, high = self.bounds[name]
+        declared = self.declared[name]
+        self.weights[name] = min(max(declared * score, declared * low), declared * high)
+        return self.weights[name]
+
+    def total(self, outcome: str) -> int:
+        return sum(counter[outcome] for counter in self.outcomes.values())
+
+    def report(self) -> List[Tuple[str, float, Counter]]:
+        return [(name, self.weights[name], self.outcomes[name]) for name in sorted(self.weights)]
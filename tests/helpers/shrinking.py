@@ -0,0 +1,57 @@
+from collections import Counter
+from typing import Callable, List, Optional, Sequence
+
+
+def shrink_flows(
+    names: Sequence[str],
+    failing: int,
+    reproduces: Callable[[List[bool], int, Optional[int]], Optional[int]],
+) -> List[int]:
+    """
+    Removal order of Wake's `-SH` shrinker. Returns the indices of the flow
+    calls that are kept, up to the (possibly earlier) failing call.
+
+    `reproduces(required, start, save_at)` replays the calls marked in
+    `required`, starting with the state before call `start` (0 is right after
+    pre_sequence), and returns the index of the call at which the original
+    failure occurred again, or None if it did not occur up to `failing`.
+    When `save_at` is given, the state before that call has to be kept as the
+    starting point of the next candidate, whose `start` is `save_at`.
+
+    1. Flow type removal: for every flow name called more than once, most
+       frequent first, all its calls are removed at once.
+    2. Brute force: the remaining calls are removed one at a time, front to
+       back, each candidate resuming from the state before the previous one.
+
+    A failure reproduced at an earlier call than `failing` shortens the
+    sequence to that call.
+    """
+    required = [True] * len(names)
+    counts = Counter(names[:failing + 1])
+
+    for name, count in sorted(counts.items(), key=lambda item: (-item[1], item[0])):
+        if count <= 1:
+            break
+        candidate = [keep and names[i] != name for i, keep in enumerate(required)]
+        index = reproduces(candidate, 0, None)
+        if index is not None:
+            for i in range(index):
+                if names[i] == name:
+                    required[i] = False
+            failing = index
+
+    previous = -1
+    current = next((i for i in range(failing + 1) if required[i]), failing + 1)
+    while current <= failing:
+        required[current] = False
+        index = reproduces(list(required), max(previous, 0), current if current != 0 else None)
+        if index is None:
+            required[current] = True
+        else:
+            failing = index
+        previous = current
+        current += 1
+        while current <= failing and not required[current]:
+            current += 1
+
+    return [i for i in range(failing + 1) if required[i]]
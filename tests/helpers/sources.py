@@ -0,0 +1,156 @@
+"""
+Content-hash index of the Solidity sources the tests depend on.
+
+Only the import closure of the compilation targets (every .sol file outside
+the `exclude_paths` of wake.toml) is hashed, so the OpenZeppelin files that
+are never imported are neither read nor compiled. The index is stored in
+`.wake/source-index.json`:
+
+{
+  "version": 1,
+  "files": {"contracts/Vault.sol": "<sha256>", "node_modules/@openzeppelin/...": "<sha256>", ...}
+}
+
+Regenerate pytypes only when a source of the closure changed (or pytypes are
+missing). `wake init pytypes` cannot regenerate single compilation units, so
+a change regenerates all of them; what is saved is the run when nothing changed:
+
+    python -m tests.helpers.sources
+    python -m tests.helpers.sources --check     # exit code 1 when pytypes are stale, nothing is run
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    import tomli as tomllib
+
+FORMAT_VERSION = 1
+
+INDEX = Path(".wake/source-index.json")
+PYTYPES_DIR = Path("pytypes")
+PYTYPES_CMD = ["wake", "init", "pytypes"]
+## never holds compilation targets, only sources imported from them
+PRUNED_DIRS = {"node_modules"}
+
+## import "a.sol"; import "a.sol" as A; import * as A from "a.sol"; import {B} from "a.sol";
+IMPORT_RE = re.compile(r"""\bimport\s+(?:[^;"']*?\bfrom\s+)?["']([^"']+)["']""")
+
+
+def load_config(root: Path) -> Dict:
+    path = root / "wake.toml"
+    if not path.exists():
+        return {}
+    with path.open("rb") as f:
+        return tomllib.load(f).get("compiler", {}).get("solc", {})
+
+
+def targets(root: Path, exclude_paths: Sequence[str]) -> List[Path]:
+    excluded = {(root / p).resolve() for p in exclude_paths}
+    found = []
+    for directory, dirnames, filenames in os.walk(root):
+        ## pruned instead of filtered, node_modules alone holds tens of thousands of files
+        dirnames[:] = [
+            name for name in dirnames
+            if not name.startswith(".") and name not in PRUNED_DIRS and (Path(directory) / name).resolve() not in excluded
+        ]
+        found.extend(Path(directory) / name for name in filenames if name.endswith(".sol"))
+    return sorted(found)
+
+
+def resolve(source: Path, import_path: str, root: Path, include_paths: Sequence[str]) -> Optional[Path]:
+    if import_path.startswith("."):
+        candidates = [source.parent / import_path]
+    else:
+        candidates = [root / import_path] + [root / include / import_path for include in include_paths]
+    for candidate in candidates:
+        if candidate.is_file():
+            return candidate.resolve()
+    ## e.g. wake/console.sol, provided by the compiler setup itself
+    return None
+
+
+def import_closure(root: Path, sources: Sequence[Path], include_paths: Sequence[str]) -> Dict[Path, str]:
+    """
+    sha256 of every file reachable from `sources` through imports, keyed by absolute path.
+    """
+    hashes: Dict[Path, str] = {}
+    pending = [source.resolve() for source in sources]
+    seen: Set[Path] = set(pending)
+    while pending:
+        path = pending.pop()
+        content = path.read_bytes()
+        hashes[path] = hashlib.sha256(content).hexdigest()
+        for import_path in IMPORT_RE.findall(content.decode("utf-8", errors="replace")):
+            resolved = resolve(path, import_path, root, include_paths)
+            if resolved is not None and resolved not in seen:
+                seen.add(resolved)
+                pending.append(resolved)
+    return hashes
+
+
+def build_index(root: Path) -> Dict[str, str]:
+    config = load_config(root)
+    sources = targets(root, config.get("exclude_paths", []))
+    hashes = import_closure(root, sources, config.get("include_paths", []))
+    return {path.relative_to(root.resolve()).as_posix(): digest for path, digest in sorted(hashes.items())}
+
+
+def load_index(path: Path) -> Dict[str, str]:
+    if not path.exists():
+        return {}
+    data = json.loads(path.read_text())
+    if data.get("version") != FORMAT_VERSION:
+        return {}
+    return data["files"]
+
+
+def save_index(path: Path, files: Dict[str, str]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"version": FORMAT_VERSION, "files": files}, indent=1))
+
+
+def changed_files(old: Dict[str, str], new: Dict[str, str]) -> List[str]:
+    ## added, removed or modified
+    return sorted(path for path in old.keys() | new.keys() if old.get(path) != new.get(path))
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Regenerate pytypes only when the compiled sources changed.")
+    parser.add_argument("--check", action="store_true", help="only report whether pytypes are stale")
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args(argv)
+
+    root = Path.cwd()
+    index = build_index(root)
+    changed = changed_files(load_index(INDEX), index)
+    stale = args.force or bool(changed) or not PYTYPES_DIR.exists()
+
+    dependencies = sum(1 for path in index if path.startswith("node_modules/"))
+    print(f"{len(index)} sources in the import closure ({dependencies} from node_modules)")
+    for path in changed:
+        print(f"  changed {path}")
+
+    if not stale:
+        print("pytypes up to date")
+        return 0
+    if args.check:
+        print("pytypes stale")
+        return 1
+
+    ret = subprocess.run(PYTYPES_CMD).returncode
+    if ret == 0:
+        save_index(INDEX, index)
+    return ret
+
+
+if __name__ == "__main__":
+    sys.exit(main())
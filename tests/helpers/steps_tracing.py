@@ -0,0 +1,23 @@
+from wake.development.globals import get_config
+
+STEPS_TRACING = "--steps-tracing"
+
+
+def without_steps_tracing() -> bool:
+    """
+    Removes `--steps-tracing` from the anvil arguments of every chain
+    launched afterwards in this process. Returns whether it was set.
+
+    Anvil then no longer records the execution steps of every transaction,
+    which makes clean fuzz runs faster. The cost: Wake builds `tx.call_trace`
+    from those steps, so call traces printed on failure are incomplete, and
+    crash signatures (tests/helpers/distributed.py)
+    fall back to Python frames. Only for fuzz runs that do not need traces.
+    """
+    config = get_config()
+    args = config.testing.anvil.cmd_args.split()
+    if STEPS_TRACING not in args:
+        return False
+    args.remove(STEPS_TRACING)
+    config.update({"testing": {"anvil": {"cmd_args": " ".join(args)}}}, [])
+    return True
@@ -0,0 +1,252 @@
+import contextlib
+import io
+import multiprocessing
+import os
+import pickle
+import queue
+import time
+import traceback
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Type
+
+from wake.testing import *
+from wake.testing import random
+from wake.testing.fuzzing import *
+
+from tests.helpers.adaptive_flows import AdaptiveFuzzTest
+from tests.helpers.fixed_setup import FixedSetupFuzzTest
+
+CRASH_DIR = Path(".wake/logs/crashes")
+
+## WAKE_POOL_REPLAY=<setup seed>:<sequence seed>[:<scheduler file>] runs a single sequence in-process instead of the pool
+REPLAY_ENV = "WAKE_POOL_REPLAY"
+
+
+@dataclass
+class SequenceResult:
+    worker: int
+    seed: int
+    elapsed: float
+    ## formatted traceback and captured output of a failed sequence
+    error: Optional[str] = None
+    output: str = ""
+    ## pickled adaptive scheduler at the start of a failed sequence, the pool's flow weights depend on earlier sequences
+    scheduler: Optional[bytes] = None
+
+
+def _prepare(test_class: Type[FuzzTest], setup_seed: int) -> None:
+    ## the deployment is seeded separately, so that every worker deploys the same contracts
+    if issubclass(test_class, FixedSetupFuzzTest):
+        test_class.setup_once(setup_seed)
+
+
+def run_sequence(test_class: Type[FuzzTest], seed: int, flows_count: int) -> None:
+    ## flows and their inputs are drawn from Wake's random, not the global one
+    random.seed(seed)
+    test_class.run(1, flows_count)
+
+
+@contextlib.contextmanager
+def _starting_scheduler(test_class: Type[FuzzTest], scheduler: Optional[Any]):
+    ## ADAPTIVE_INITIAL only for the runs inside the block, later runs of the class start from the declared weights again
+    if scheduler is None:
+        yield
+        return
+    own = "ADAPTIVE_INITIAL" in vars(test_class)
+    previous = getattr(test_class, "ADAPTIVE_INITIAL", None)
+    test_class.ADAPTIVE_INITIAL = scheduler
+    try:
+        yield
+    finally:
+        if own:
+            test_class.ADAPTIVE_INITIAL = previous
+        else:
+            del test_class.ADAPTIVE_INITIAL
+
+
+class _SeedsExhausted(BaseException):
+    ## ends a worker's run() between two sequences, not an Exception so that the failure handlers of the test ignore it
+    pass
+
+
+def _pooled(test_class: Type[FuzzTest], next_seed: Callable[[], Optional[int]]) -> Type[FuzzTest]:
+    ## every sequence of one long run() is reseeded from the queue, as if it was run by run_sequence
+    class Pooled(test_class):
+        def pre_sequence(self):
+            seed = next_seed()
+            if seed is None:
+                raise _SeedsExhausted()
+            random.seed(seed)
+            super().pre_sequence()
+
+    Pooled.__name__ = Pooled.__qualname__ = test_class.__name__
+    return Pooled
+
+
+def _worker(
+    worker: int,
+    test_class: Type[FuzzTest],
+    setup_seed: int,
+    sequences_count: int,
+    flows_count: int,
+    connect_kwargs: Dict[str, Any],
+    seeds: "multiprocessing.Queue",
+    results: "multiprocessing.Queue",
+    stop: "multiprocessing.synchronize.Event",
+) -> None:
+    output = io.StringIO()
+    ## seed, start time and starting scheduler of the running sequence
+    running: List[Any] = []
+
+    def next_seed() -> Optional[int]:
+        if running:
+            results.put(SequenceResult(worker, running[0], time.perf_counter() - running[1]))
+            running.clear()
+        output.seek(0)
+        output.truncate()
+        seed = None if stop.is_set() else seeds.get()
+        if seed is not None:
+            scheduler = pickle.dumps(pooled._scheduler) if issubclass(pooled, AdaptiveFuzzTest) else None
+            running.extend((seed, time.perf_counter(), scheduler))
+        return seed
+
+    pooled = _pooled(test_class, next_seed)
+    while not stop.is_set():
+        ## a failed sequence leaves the chain in an unknown state, it is restarted with a fresh deployment
+        with chain.connect(**connect_kwargs):
+            _prepare(test_class, setup_seed)
+            try:
+                ## one run() for all sequences of the worker, so the adaptive scheduler keeps learning
+                ## and profiles, gas and flow logs are reported once; a worker never runs more than all sequences
+                with contextlib.redirect_stdout(output):
+                    pooled.run(sequences_count + 1, flows_count)
+            except _SeedsExhausted:
+                ## what run() printed after the last sequence, i.e. the reports
+                print(f"worker {worker}:\n{output.getvalue()}")
+                return
+            except Exception:
+                seed, start, scheduler = running
+                running.clear()
+                results.put(SequenceResult(worker, seed, time.perf_counter() - start, traceback.format_exc(), output.getvalue(), scheduler))
+
+
+def run_pool(
+    test_class: Type[FuzzTest],
+    sequences_count: int,
+    flows_count: int,
+    workers: Optional[int] = None,
+    fail_fast: bool = True,
+    **connect_kwargs: Any,
+) -> List[SequenceResult]:
+    """
+    Runs `sequences_count` sequences of `test_class` in a pool of long-lived
+    worker processes.
+
+    Workers are forked from the calling process, so the test module and
+    pytypes are imported once. Each worker starts its chain and (for
+    FixedSetupFuzzTest) deploys once, then runs a single `run()` whose
+    sequences take their seeds from a shared queue until it is empty, so a
+    slow sequence only occupies its own worker. Per-run state (adaptive flow
+    weights, profile, gas and flow log reports) is therefore kept per worker,
+    and only restarted with the chain after a failed sequence. Results are
+    streamed back as sequences finish. Failed sequences are written to
+    CRASH_DIR with the seeds to replay them:
+
+        WAKE_POOL_REPLAY=<setup seed>:<seed>[:<scheduler file>] wake test tests/test_vault_fuzz_pool.py
+
+    The adaptive weights a sequence started with depend on the sequences the
+    worker ran before, so for AdaptiveFuzzTest the starting scheduler is
+    saved next to the crash log and is part of the replay value.
+
+    Seeds are drawn from Wake's `random`, so the whole pool run is
+    reproducible from the `-S` seed of `wake test`. Must be called outside of
+    `chain.connect()`.
+    """
+    replay = os.environ.get(REPLAY_ENV)
+    if replay:
+        setup_seed, seed, *scheduler = replay.split(":", 2)
+        setup_seed, seed = int(setup_seed, 0), int(seed, 0)
+        initial = pickle.loads(Path(scheduler[0]).read_bytes()) if scheduler else None
+        with chain.connect(**connect_kwargs):
+            _prepare(test_class, setup_seed)
+            with _starting_scheduler(test_class, initial):
+                run_sequence(test_class, seed, flows_count)
+        return [SequenceResult(0, seed, 0.0)]
+
+    workers = workers or os.cpu_count() or 1
+    setup_seed = random.getrandbits(64)
+    sequence_seeds = [random.getrandbits(64) for _ in range(sequences_count)]
+
+    context = multiprocessing.get_context("fork")
+    seeds = context.Queue()
+    results = context.Queue()
+    stop = context.Event()
+    for seed in sequence_seeds:
+        seeds.put(seed)
+    for _ in range(workers):
+        seeds.put(None)
+
+    processes = [
+        context.Process(
+            target=_worker,
+            args=(i, test_class, setup_seed, sequences_count, flows_count, connect_kwargs, seeds, results, stop),
+            daemon=True,
+        )
+        for i in range(workers)
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+
+    finished: List[SequenceResult] = []
+    try:
+        while len(finished) < sequences_count:
+            try:
+                result = results.get(timeout=1)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    break
+                continue
+
+            finished.append(result)
+            if result.error is None:
+                print(f"[{len(finished)}/{sequences_count}] worker {result.worker} seed {result.seed:#x} {result.elapsed:.1f}s")
+                continue
+
+            path = _write_crash(test_class, setup_seed, result)
+            print(f"[{len(finished)}/{sequences_count}] worker {result.worker} seed {result.seed:#x} FAILED, crash log {path}")
+            if fail_fast:
+                stop.set()
+                break
+    finally:
+        stop.set()
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+
+    elapsed = time.perf_counter() - start
+    print(f"{len(finished)} sequences in {elapsed:.1f}s with {workers} workers ({len(finished) / max(elapsed, 1e-9):.2f} sequences/s)")
+
+    failed = [result for result in finished if result.error is not None]
+    assert not failed, f"{len(failed)} sequences failed, first:\n{failed[0].error}"
+    assert len(finished) == sequences_count, f"only {len(finished)} of {sequences_count} sequences finished"
+    return finished
+
+
+def _write_crash(test_class: Type[FuzzTest], setup_seed: int, result: SequenceResult) -> Path:
+    CRASH_DIR.mkdir(parents=True, exist_ok=True)
+    path = CRASH_DIR / f"pool-{time.strftime('%Y%m%d-%H%M%S')}-{result.seed:x}.txt"
+    replay = f"{setup_seed:#x}:{result.seed:#x}"
+    if result.scheduler is not None:
+        scheduler = path.with_suffix(".scheduler.pickle")
+        scheduler.write_bytes(result.scheduler)
+        replay += f":{scheduler}"
+    path.write_text(
+        f"{test_class.__name__} sequence failed in worker {result.worker}\n"
+        f"replay: {REPLAY_ENV}={replay}\n\n"
+        f"{result.error}\n"
+        f"output:\n{result.output}"
+    )
+    return path
@@ -0,0 +1,100 @@
+import json
+import tempfile
+from pathlib import Path
+
+from wake.testing import *
+
+from pytypes.contracts.Token import Token
+from pytypes.contracts.Vault import SingleTokenVault
+
+from scripts.deploy import MAX_DEPOSIT_AMOUNT, MIN_DEPOSIT_AMOUNT, TREASURY_MINT_AMOUNT, build_pipeline
+from scripts.pipeline import CONFIRMED, SENT, create_address
+
+
+@chain.connect()
+def test_deploy_pipeline():
+    deployer = chain.accounts[0]
+    treasury = chain.accounts[1]
+
+    with tempfile.TemporaryDirectory() as directory:
+        manifest = Path(directory) / "manifest.json"
+        nonce = deployer.nonce
+
+        addresses = build_pipeline(deployer, treasury, manifest).run()
+        steps = json.loads(manifest.read_text())["steps"]
+
+        assert deployer.nonce == nonce + 5
+        assert all(addresses[name] == create_address(deployer.address, steps[name]["nonce"]) for name in addresses)
+        ## the deployments without dependencies are sent in the first wave, the vault waits for the token
+        assert sorted(steps[name]["nonce"] for name in ("token", "permit_token", "eip712_example")) == [nonce, nonce + 1, nonce + 2]
+        assert steps["vault"]["nonce"] > steps["token"]["nonce"]
+
+        vault = SingleTokenVault(addresses["vault"])
+        token = Token(addresses["token"])
+        assert vault.token() == token.address
+        assert vault.minDepositAmount() == MIN_DEPOSIT_AMOUNT
+        assert vault.maxDepositAmount() == MAX_DEPOSIT_AMOUNT
+        assert token.tokenBalance(treasury) == TREASURY_MINT_AMOUNT
+
+        assert all(step["status"] == CONFIRMED for step in steps.values())
+
+        ## rerun sends nothing
+        assert build_pipeline(deployer, treasury, manifest).run() == addresses
+        assert deployer.nonce == nonce + 5
+
+
+@chain.connect()
+def test_deploy_pipeline_resumes_unconfirmed_steps():
+    deployer = chain.accounts[0]
+    treasury = chain.accounts[1]
+
+    with tempfile.TemporaryDirectory() as directory:
+        manifest = Path(directory) / "manifest.json"
+        addresses = build_pipeline(deployer, treasury, manifest).run()
+
+        ## as if the run was interrupted before the mint was mined
+        data = json.loads(manifest.read_text())
+        data["steps"]["mint_treasury"] = {"status": "sent", "nonce": 0, "tx_hash": "0x" + "00" * 32, "address": None}
+        manifest.write_text(json.dumps(data))
+        nonce = deployer.nonce
+
+        assert build_pipeline(deployer, treasury, manifest).run() == addresses
+        assert deployer.nonce == nonce + 1
+        assert Token(addresses["token"]).tokenBalance(treasury) == 2 * TREASURY_MINT_AMOUNT
+        assert json.loads(manifest.read_text())["steps"]["mint_treasury"]["status"] == CONFIRMED
+
+
+@chain.connect()
+def test_deploy_pipeline_waits_for_pending_steps():
+    deployer = chain.accounts[0]
+    treasury = chain.accounts[1]
+
+    with tempfile.TemporaryDirectory() as directory:
+        manifest = Path(directory) / "manifest.json"
+        addresses = build_pipeline(deployer, treasury, manifest).run()
+        token = Token(addresses["token"])
+
+        ## as if the run was interrupted while the mint was still pending
+        chain.automine = False
+        tx = token.mintTokens(treasury, TREASURY_MINT_AMOUNT, from_=deployer, confirmations=0)
+        data = json.loads(manifest.read_text())
+        data["steps"]["mint_treasury"] = {"status": "sent", "nonce": tx.nonce, "tx_hash": tx.tx_hash, "address": None}
+        manifest.write_text(json.dumps(data))
+
+        pipeline = build_pipeline(deployer, treasury, manifest)
+        assert pipeline._reconcile(data["steps"]["mint_treasury"]) == SENT
+
+        ## blocks are only mined while the pipeline waits between receipt polls
+        polls = []
+        pipeline.sleep = lambda seconds: (polls.append(seconds), chain.mine())
+        nonce = deployer.nonce
+        try:
+            assert pipeline.run() == addresses
+        finally:
+            chain.automine = True
+
+        ## waited for instead of sent again
+        assert polls
+        assert deployer.nonce == nonce + 1
+        assert token.tokenBalance(treasury) == 2 * TREASURY_MINT_AMOUNT
+        assert json.loads(manifest.read_text())["steps"]["mint_treasury"]["status"] == CONFIRMED
@@ -0,0 +1,788 @@
+from collections import defaultdict
+
+import rlp
+from wake.development.transactions import ChainTransactions
+from wake.testing import random
+from wake.testing.fuzzing import FuzzTest, flow, invariant
+
+from tests.helpers import benchmark, bounded, checkpoints, gas, storage
+from tests.helpers.benchmark import BenchmarkRecorder, cells, compare, load, save
+from tests.helpers.crash_buckets import Campaign, CrashReport, SharedDirectory, crash_signature
+from tests.helpers.dirty_set import DirtySet
+from tests.helpers.distributed import _failing_step
+from tests.helpers.fixed_setup import FixedSetupFuzzTest
+from tests.helpers.flow_log import FlowLog
+from tests.helpers.indexed_set import IndexedSet
+from tests.helpers.input_pool import UINT256_MAX, InputPools, IntPool
+from tests.helpers.invariant_policy import END_OF_SEQUENCE, EVERY_FLOW, PROBABILISTIC, InvariantPolicy
+from tests.helpers.ledger import Ledger
+from tests.helpers.model import capture_model, copy_model, restore_model
+from tests.helpers.profiler import FuzzProfiler, Histogram
+from tests.helpers.report_paths import report_path
+from tests.helpers.retention import RetentionWindow, SpillLog, trim_history
+from tests.helpers.scheduler import NEW_STATE, SKIPPED, SUCCEEDED, AdaptiveScheduler
+from tests.helpers.shrinking import shrink_flows
+from tests.helpers.sources import build_index, changed_files
+from tests.helpers.worker_pool import _starting_scheduler
+
+
+def test_dirty_set_selects_touched_only():
+    dirty = DirtySet(full_sweep_period=3)
+    model = {"alice": 1, "bob": 2, "carol": 3}
+
+    ## first check after pre_sequence is a full sweep
+    assert sorted(dirty.select(model)) == ["alice", "bob", "carol"]
+    dirty.checked()
+
+    dirty.touch("bob", "vault")
+    dirty.flow_done()
+    assert dirty.select(model) == ["bob"]
+    dirty.checked()
+
+    dirty.flow_done()
+    assert dirty.select(model) == []
+    dirty.checked()
+
+
+def test_dirty_set_full_sweep_period():
+    dirty = DirtySet(full_sweep_period=2)
+    model = {"alice": 1, "bob": 2}
+    dirty.checked()
+
+    dirty.flow_done()
+    dirty.checked()
+    dirty.flow_done()
+    assert dirty.full_sweep
+    assert sorted(dirty.select(model)) == ["alice", "bob"]
+    dirty.checked()
+    assert not dirty.full_sweep
+
+    dirty.request_full_sweep()
+    assert sorted(dirty.select(model)) == ["alice", "bob"]
+
+
+def test_restore_model_copies_containers():
+    class Model:
+        pass
+
+    shared = object()
+    model = Model()
+    model.balances = defaultdict(int, {"alice": 1})
+    model.users = ["alice"]
+    model.contract = shared
+
+    captured = capture_model(model)
+    model.balances["bob"] += 5
+    model.users.append("bob")
+
+    restore_model(model, captured)
+    assert model.balances == {"alice": 1}
+    assert model.users == ["alice"]
+    assert model.contract is shared
+
+    ## the captured model stays untouched, so it can be restored again
+    model.balances["alice"] = 10
+    restore_model(model, captured)
+    assert model.balances["alice"] == 1
+    assert model.balances["carol"] == 0
+
+
+def test_adaptive_scheduler_reweights_within_bounds():
+    scheduler = AdaptiveScheduler({"flow_a": 100, "flow_b": 100}, bounds=(0.5, 2.0), alpha=0.5)
+
+    for _ in range(20):
+        outcome = scheduler.outcome("nothing to do", None)
+        assert outcome == SKIPPED
+        scheduler.record("flow_a", outcome)
+        scheduler.record("flow_b", scheduler.outcome(None, ("state", 1)))
+
+    assert scheduler.weights["flow_a"] == 50
+    assert round(scheduler.weights["flow_b"]) == 100
+    assert scheduler.outcomes["flow_b"] == {NEW_STATE: 1, SUCCEEDED: 19}
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for ms in range(1, 101):
+        histogram.add(ms / 1000)
+
+    assert histogram.count == 100
+    assert histogram.max == 0.1
+    ## buckets are 10 % wide
+    assert 0.045 <= histogram.percentile(0.5) <= 0.056
+    assert 0.09 <= histogram.percentile(0.95) <= 0.1
+
+
+def test_profiler_counts_rpc_of_current_section():
+
+    class Interface:
+        def call(self, params):
+            return b""
+
+        def send_transaction(self, params):
+            return "0x01"
+
+        def get_transaction_receipt(self, tx_hash):
+            return {"gasUsed": "0x5208"}
+
+    interface = Interface()
+    profiler = FuzzProfiler()
+    profiler.install(interface)
+
+    interface.call({})
+    profiler.start("flows", "flow_deposit")
+    interface.send_transaction({})
+    interface.get_transaction_receipt("0x01")
+    interface.get_transaction_receipt("0x01")
+    profiler.stop()
+    profiler.uninstall()
+
+    stats = profiler.to_json()["flows"]["flow_deposit"]
+    assert stats["calls"] == 1
+    assert stats["rpc_calls"] == 3
+    assert stats["transactions"] == 1
+    assert stats["gas_used"] == 21000
+    assert "call" not in vars(interface)
+
+
+def test_benchmark_compare_flags_regressions():
+    baseline = [
+        {"benchmark": "vault_fuzz", "backend": "anvil", "accounts": 10, "flows": 100, "users": 10,
+         "flows_per_s": 100.0, "txs_per_s": 50.0, "peak_rss_kb": 1000},
+        {"benchmark": "token_transfer", "backend": "anvil", "accounts": 10, "txs_per_s": 200.0},
+    ]
+    current = [
+        {"benchmark": "vault_fuzz", "backend": "anvil", "accounts": 10, "flows": 100, "users": 10,
+         "flows_per_s": 80.0, "txs_per_s": 49.0, "peak_rss_kb": 1500},
+        {"benchmark": "token_transfer", "backend": "anvil", "accounts": 10, "txs_per_s": 300.0},
+        {"benchmark": "token_transfer", "backend": "revm", "accounts": 10, "txs_per_s": 1.0},
+    ]
+
+    regressions = compare(baseline, current, threshold=0.1)
+    assert len(regressions) == 2
+    assert "flows_per_s" in regressions[0]
+    assert "peak_rss_kb" in regressions[1]
+
+
+def test_benchmark_results_round_trip(tmp_path):
+    path = tmp_path / "results.json"
+    recorder = BenchmarkRecorder(path)
+    recorder.record(benchmark="token_transfer", backend="anvil", txs_per_s=1.5)
+
+    assert load(path) == [{"benchmark": "token_transfer", "backend": "anvil", "txs_per_s": 1.5}]
+
+
+def test_benchmark_cells_run_one_configuration_each(monkeypatch):
+    monkeypatch.setenv("WAKE_BENCH_ACCOUNTS", "10,50")
+    monkeypatch.setenv("WAKE_BENCH_FLOWS", "100")
+    monkeypatch.setenv("WAKE_BENCH_USERS", "10,50")
+
+    vault_cells = [env for node_id, env in cells() if node_id.endswith("::test_bench_vault_fuzz")]
+    assert [(env["WAKE_BENCH_ACCOUNTS"], env["WAKE_BENCH_USERS"]) for env in vault_cells] == [("10", "10"), ("50", "10"), ("50", "50")]
+    assert all(env["WAKE_BENCH_FLOWS"] == "100" for env in vault_cells)
+
+
+def test_benchmark_skips_unsupported_backends(tmp_path, monkeypatch):
+    monkeypatch.setenv("WAKE_BENCH_ACCOUNTS", "10")
+    monkeypatch.setenv("WAKE_BENCH_FLOWS", "100")
+    monkeypatch.setenv("WAKE_BENCH_USERS", "10")
+    monkeypatch.setattr(benchmark, "RESULTS_DIR", tmp_path)
+    ran = []
+
+    def run_cell(backend, node_id, env, output):
+        ran.append(backend)
+        save(output, [{"benchmark": node_id, "backend": backend or "anvil"}])
+        return 0
+
+    monkeypatch.setattr(benchmark, "_run_cell", run_cell)
+    assert benchmark.main(["--backends", "anvil,revm", "--baseline", str(tmp_path / "baseline.json")]) == 0
+    assert ran == ["anvil"] * len(cells())
+
+    ran.clear()
+    assert benchmark.main(["--baseline", str(tmp_path / "baseline.json")]) == 0
+    ## the backend configured in wake.toml
+    assert ran == [None] * len(cells())
+
+
+def test_starting_scheduler_is_restored():
+    class _Adaptive:
+        ADAPTIVE_INITIAL = None
+
+    class _Pooled(_Adaptive):
+        pass
+
+    scheduler = AdaptiveScheduler({"flow_a": 100})
+    with _starting_scheduler(_Pooled, scheduler):
+        assert _Pooled.ADAPTIVE_INITIAL is scheduler
+    assert _Pooled.ADAPTIVE_INITIAL is None and "ADAPTIVE_INITIAL" not in vars(_Pooled)
+
+    try:
+        with _starting_scheduler(_Adaptive, scheduler):
+            raise ValueError
+    except ValueError:
+        pass
+    assert _Adaptive.ADAPTIVE_INITIAL is None
+
+
+def test_ledger_interns_and_updates():
+    ledger = Ledger()
+    ledger["alice"] += 10
+    ledger.apply([("alice", -4), ("vault", 4)])
+
+    assert ledger["alice"] == 6
+    assert ledger["vault"] == 4
+    assert ledger["bob"] == 0
+    assert "bob" not in ledger
+    assert list(ledger) == ["alice", "vault"]
+    assert ledger.index("vault") == 1
+
+
+def test_ledger_mismatches():
+    ledger = Ledger()
+    ledger.apply([("alice", 1), ("bob", 2), ("carol", 2**256 - 1)])
+
+    assert ledger.mismatches([1, 2, 2**256 - 1]) == []
+    assert ledger.mismatches([1, 3, 2**256 - 1]) == [("bob", 2, 3)]
+    assert ledger.mismatches([2**256 - 1, 0], keys=["carol", "dave"]) == []
+    assert ledger.mismatches([5], keys=["alice"]) == [("alice", 1, 5)]
+
+
+def test_ledger_copy_model():
+    ledger = Ledger()
+    ledger["alice"] = 1
+    copied = copy_model(ledger)
+    copied["alice"] = 2
+    copied["bob"] = 3
+
+    assert ledger["alice"] == 1
+    assert "bob" not in ledger
+
+
+def test_indexed_set_add_discard_choice():
+    items = IndexedSet(["alice", "bob", "carol"])
+    items.add("bob")
+    items.discard("alice")
+    items.discard("dave")
+
+    assert len(items) == 2
+    assert sorted(items) == ["bob", "carol"]
+    assert "alice" not in items
+
+    random.seed(42)
+    first = [items.choice() for _ in range(20)]
+    random.seed(42)
+    assert [items.choice() for _ in range(20)] == first
+    assert set(first) == {"bob", "carol"}
+
+
+def test_ledger_tracks_positive_balances():
+    ledger = Ledger(track_positive=True)
+    ledger.apply([("alice", 5), ("bob", 3)])
+    ledger["bob"] -= 3
+
+    assert list(ledger.positive) == ["alice"]
+    assert copy_model(ledger).positive is not ledger.positive
+
+    untracked = Ledger()
+    untracked.apply([("alice", 5)])
+    assert untracked.positive is None and copy_model(untracked).positive is None
+
+
+def test_int_pool_is_reproducible_and_in_range():
+    random.seed(7)
+    pool = IntPool(block_size=16, boundary_prob=0.0)
+    first = [pool.draw(10, 20) for _ in range(40)]
+
+    random.seed(7)
+    pool = IntPool(block_size=16, boundary_prob=0.0)
+    assert [pool.draw(10, 20) for _ in range(40)] == first
+    assert all(10 <= value <= 20 for value in first)
+
+
+def test_int_pool_boundary_bias():
+    random.seed(7)
+    pool = IntPool(block_size=64, boundary_prob=1.0)
+    boundaries = (0, 21, UINT256_MAX)
+
+    assert {pool.draw(10, 20, boundaries) for _ in range(200)} == set(boundaries)
+
+
+def test_input_pools_copy_model_replays_draws():
+    random.seed(3)
+    pools = InputPools(block_size=8)
+    pools["amount"].draw(0, 100)
+
+    ## a replay restores the model copy together with the random state
+    copied = copy_model(pools)
+    state = random.getstate()
+    first = [pools["amount"].draw(0, 10**20) for _ in range(20)]
+    random.setstate(state)
+    assert [copied["amount"].draw(0, 10**20) for _ in range(20)] == first
+
+
+def test_input_pools_new_flow_draws_from_random_state_only():
+    ## what Wake's -SH replay does: restore the flow's random state, skip the earlier flows
+    random.seed(5)
+    pools = InputPools(block_size=8)
+    pools["amount"].draw(0, 100)
+    pools.new_flow()
+    state = random.getstate()
+    first = [pools["amount"].draw(0, 10**20) for _ in range(3)]
+
+    replayed = InputPools(block_size=8)
+    random.setstate(state)
+    replayed.new_flow()
+    assert [replayed["amount"].draw(0, 10**20) for _ in range(3)] == first
+
+
+class _StorageInterface:
+    def __init__(self, values):
+        self.values = values
+        self.reads = []
+
+    def get_storage_at(self, address, slot):
+        self.reads.append(slot)
+        return self.values[slot].to_bytes(32, "big")
+
+
+class _LayoutContract:
+    _storage_layout = {"storage": [{"label": "_totalDeposits", "slot": "0"}, {"label": "_balances", "slot": "1"}]}
+    address = "0x" + "11" * 20
+
+
+class _StorageChain:
+    def __init__(self, chain_interface):
+        self.chain_interface = chain_interface
+
+
+def test_storage_reader_falls_back_without_batch_support(monkeypatch):
+    ## no private communicator, e.g. after a Wake upgrade renamed it
+    interface = _StorageInterface({0: 7, 1: 0, 5: 2**255})
+    monkeypatch.setattr(storage, "chain", _StorageChain(interface))
+    reader = storage.StorageReader(_LayoutContract())
+    assert reader.read([reader.slot("_totalDeposits"), 5, 1]) == [7, 2**255, 0]
+    assert interface.reads == [0, 5, 1]
+
+    ## a communicator without the protocol attribute path
+    interface = _StorageInterface({0: 7, 1: 3})
+    interface._communicator = object()
+    monkeypatch.setattr(storage, "chain", _StorageChain(interface))
+    assert reader.read([0, 1]) == [7, 3]
+    assert interface.reads == [0, 1]
+
+
+def test_dirty_set_copy_model():
+    dirty = DirtySet(full_sweep_period=2)
+    dirty.checked()
+    dirty.touch("a")
+    dirty.flow_done()
+
+    copied = copy_model(dirty)
+    dirty.touch("b")
+    dirty.flow_done()
+
+    assert dirty.full_sweep
+    assert not copied.full_sweep
+    assert copied.select({"a": 1, "b": 2}) == ["a"]
+
+
+def test_shrink_flows_follows_wake_order():
+    names = ["a", "b", "a", "c", "b", "a", "d", "c", "a", "b"]
+    ## fails at the first call after which "b" and then "d" have run, i.e. at #6
+    saved = {0: ()}
+    starts = []
+
+    def reproduces(required, start, save_at):
+        ## a candidate starts from the state saved by the previous one
+        starts.append(start)
+        executed = saved[start]
+        for i in range(start, len(names)):
+            if i == save_at:
+                saved[i] = executed
+            if required[i]:
+                executed += (names[i],)
+            it = iter(executed)
+            if "b" in it and "d" in it:
+                return i
+        return None
+
+    assert shrink_flows(names, 6, reproduces) == [4, 6]
+    ## "a" and "b" removed by type, then the four remaining calls one by one
+    assert starts == [0, 0, 0, 1, 3, 4]
+
+
+class _SnapshotChain:
+    ## Wake's snapshot bookkeeping without a node: revert deletes only the reverted id
+    def __init__(self):
+        self._snapshots = {}
+        self._next = 0
+
+    def snapshot(self):
+        self._next += 1
+        self._snapshots[self._next] = {}
+        return self._next
+
+    def revert(self, snapshot_id):
+        del self._snapshots[snapshot_id]
+
+
+class _ShrinkFuzz(checkpoints.CheckpointedFuzzTest):
+    CHECKPOINT_INTERVAL = 2
+
+    @flow()
+    def flow_a(self):
+        pass
+
+    @flow()
+    def flow_b(self):
+        pass
+
+    @flow()
+    def flow_noise(self):
+        pass
+
+    @flow()
+    def flow_fail(self):
+        raise ValueError("fail")
+
+
+def _record_sequence(test, names):
+    test.pre_sequence()
+    for name in names:
+        fn = getattr(type(test), name)
+        test.pre_flow(fn)
+        try:
+            fn(test)
+        except ValueError as e:
+            return e
+        test.post_flow(fn)
+
+
+def test_checkpointed_shrink_resumes_from_later_checkpoint(tmp_path, monkeypatch):
+    snapshots = _SnapshotChain()
+    monkeypatch.setattr(checkpoints, "chain", snapshots)
+    monkeypatch.setattr(_ShrinkFuzz, "CHECKPOINT_SHRINK", True)
+    monkeypatch.setattr(_ShrinkFuzz, "SHRINK_DIR", tmp_path)
+    restored = []
+    restore = _ShrinkFuzz._restore
+    monkeypatch.setattr(_ShrinkFuzz, "_restore", lambda self, checkpoint: (restored.append(checkpoint.index), restore(self, checkpoint)))
+
+    test = _ShrinkFuzz()
+    error = _record_sequence(test, ["flow_a", "flow_b", "flow_a", "flow_noise", "flow_noise", "flow_noise", "flow_fail"])
+    assert [c.index for c in test._recording.checkpoints] == [0, 2, 4, 6]
+
+    kept = test._shrink(error)
+    assert [call.name for call in kept] == ["flow_fail"]
+    ## flow_noise is removed first, from the checkpoint before its first call
+    assert restored[0] == 2
+    ## snapshots invalidated by the replays are not kept by the chain
+    assert set(snapshots._snapshots) == {c.snapshot_id for c in test._recording.checkpoints}
+
+    ## Wake reverted the sequence, its checkpoints are dropped with it
+    test.pre_sequence()
+    assert snapshots._snapshots == {}
+
+
+def test_checkpoints_only_when_shrinking(monkeypatch):
+    snapshots = _SnapshotChain()
+    monkeypatch.setattr(checkpoints, "chain", snapshots)
+
+    test = _ShrinkFuzz()
+    _record_sequence(test, ["flow_a", "flow_b", "flow_a", "flow_fail"])
+    assert len(test._recording.calls) == 4
+    assert test._recording.checkpoints == [] and snapshots._snapshots == {}
+
+
+class _OwnerFuzz(FixedSetupFuzzTest):
+    def setup_fixed(self):
+        self.owner = random.getrandbits(64)
+
+
+def test_fixed_setup_draws_from_its_own_seed():
+    random.seed(1)
+    _OwnerFuzz._capture_fixed()
+    owner = _OwnerFuzz._fixed_model["owner"]
+    ## the sequences see the stream of the test seed, as if setup_fixed drew nothing
+    first = random.getrandbits(64)
+    random.seed(1)
+    assert first == random.getrandbits(64)
+
+    random.seed(2)
+    _OwnerFuzz._capture_fixed()
+    assert _OwnerFuzz._fixed_model["owner"] == owner
+    _OwnerFuzz._capture_fixed(seed=5)
+    assert _OwnerFuzz._fixed_model["owner"] != owner
+
+
+class _Tx:
+    def __init__(self, tx_hash, gas_used):
+        self.tx_hash = tx_hash
+        self.gas_used = gas_used
+
+
+class _Account:
+    def __init__(self, address):
+        self.address = address
+
+
+def test_flow_log_keeps_last_records():
+    log = FlowLog(capacity=3)
+    for i in range(5):
+        log.record(0, i, "deposit", _Tx(f"0x{i}", 21000 + i), user=_Account(f"0xa{i}"), amount=i)
+
+    assert len(log) == 3
+    assert log.dropped == 2
+    assert [record[1] for record in log.records()] == [2, 3, 4]
+
+    lines = log.format()
+    assert lines[0] == "... 2 earlier records dropped"
+    assert lines[1] == "sequence 0 flow 2 deposit tx 0x2 gas 21002 user=0xa2 amount=2"
+    assert lines[-1].endswith("user=0xa4 amount=4")
+
+
+def test_flow_log_formats_lists_and_missing_tx():
+    log = FlowLog(capacity=2)
+    log.record(1, 0, "deposit_reverted", users=[_Account("0x1"), _Account("0x2")], error="ZeroAmount")
+
+    assert log.format() == ["sequence 1 flow 0 deposit_reverted users=[0x1,0x2] error=ZeroAmount"]
+
+
+def test_source_index_follows_imports_only(tmp_path):
+    (tmp_path / "wake.toml").write_text(
+        '[compiler.solc]\nexclude_paths = ["node_modules"]\ninclude_paths = ["node_modules"]\n'
+    )
+    (tmp_path / "contracts").mkdir()
+    lib = tmp_path / "node_modules" / "lib"
+    lib.mkdir(parents=True)
+    (lib / "A.sol").write_text('import {B} from "./B.sol";')
+    (lib / "B.sol").write_text("contract B {}")
+    (lib / "Unused.sol").write_text("contract Unused {}")
+    vault = tmp_path / "contracts" / "Vault.sol"
+    vault.write_text('import "lib/A.sol";\nimport "wake/console.sol";')
+
+    index = build_index(tmp_path)
+    assert sorted(index) == ["contracts/Vault.sol", "node_modules/lib/A.sol", "node_modules/lib/B.sol"]
+
+    vault.write_text('import "lib/A.sol";\nimport "wake/console.sol";\ncontract Vault {}')
+    assert changed_files(index, build_index(tmp_path)) == ["contracts/Vault.sol"]
+
+
+def test_invariant_policies():
+    def checks(policy, flows=30):
+        return [i for i in range(1, flows + 1) if policy.due()]
+
+    assert checks(InvariantPolicy(EVERY_FLOW)) == list(range(1, 31))
+    assert checks(InvariantPolicy(END_OF_SEQUENCE)) == []
+
+
+def test_probabilistic_policy_does_not_use_global_random():
+    random.seed(1)
+    state = random.getstate()
+    first = InvariantPolicy(PROBABILISTIC, probability=0.5, seed=7)
+    second = InvariantPolicy(PROBABILISTIC, probability=0.5, seed=7)
+    draws = [first.due() for _ in range(200)]
+
+    assert random.getstate() == state
+    assert draws == [second.due() for _ in range(200)]
+    assert 60 < sum(draws) < 140
+
+
+def test_decode_raw_transaction():
+    to = bytes.fromhex("11" * 20)
+    data = bytes.fromhex("b6b55f25") + (5).to_bytes(32, "big")
+    legacy = rlp.encode([b"\x01", b"\x02", b"\x03", to, b"", data, b"\x1b", b"\x04", b"\x05"])
+    eip1559 = b"\x02" + rlp.encode([b"\x01", b"", b"\x01", b"\x02", b"\x03", to, b"", data, [], b"", b"\x04", b"\x05"])
+
+    assert gas.decode_raw_transaction(legacy) == ("0x" + "11" * 20, data)
+    assert gas.decode_raw_transaction("0x" + eip1559.hex()) == ("0x" + "11" * 20, data)
+
+
+def test_gas_profile_paths_and_regressions():
+    vault = "0x" + "22" * 20
+    profile = gas.GasProfile()
+    profile.track(vault, "SingleTokenVault", {bytes.fromhex("b6b55f25"): "deposit"})
+
+    for i, (status, used) in enumerate([(1, 70000), (1, 30000), (1, 31000), (0, 25000)]):
+        tx_hash = f"0x{i:02x}"
+        profile.sent(tx_hash, {"from": "0xaa", "to": vault, "data": bytes.fromhex("b6b55f25")})
+        profile.receipt(tx_hash, {"status": hex(status), "gasUsed": hex(used)})
+        ## polled again, not counted twice
+        profile.receipt(tx_hash, {"status": hex(status), "gasUsed": hex(used)})
+
+    report = profile.to_json()["functions"]
+    deposit = report["SingleTokenVault.deposit"]
+    assert deposit["success/cold"]["count"] == 1
+    assert deposit["success/warm"] == {"count": 2, "min": 30000, "mean": 30500, "std": 500, "p95": 31000, "max": 31000}
+    assert deposit["revert/warm"]["max"] == 25000
+
+    ## a constant path, any growth counts
+    current = gas.GasProfile()
+    current.track(vault, "SingleTokenVault", {bytes.fromhex("b6b55f25"): "deposit"})
+    current.sent("0x10", {"from": "0xaa", "to": vault, "data": bytes.fromhex("b6b55f25")})
+    current.receipt("0x10", {"status": 1, "gasUsed": 72000})
+    regressions = gas.compare(report, current.to_json()["functions"], threshold=0.01)
+    assert len(regressions) == 3
+    assert regressions[0].startswith("SingleTokenVault.deposit success/cold: mean 70000 -> 72000")
+
+
+def test_gas_compare_ignores_input_noise():
+    def stats(values):
+        profile = gas.GasStats()
+        for value in values:
+            profile.add(value)
+        return {"f": {"success/warm": profile.to_json()}}
+
+    ## other random amounts, the same distribution
+    baseline = stats([30000, 36000] * 500 + [50000])
+    assert gas.compare(baseline, stats([30000, 36000] * 500 + [51000])) == []
+    ## every call got more expensive
+    assert len(gas.compare(baseline, stats([31000, 37000] * 500 + [51000]))) == 3
+
+
+def _crash(worker, index, flows, step=("invariant", "invariant_balances"), frames=("VaultFuzz.flow_withdraw",)):
+    return CrashReport.create(
+        step, "AssertionError", list(frames),
+        worker=worker, index=index, setup_seed=1, seed=index, flows=flows, error="AssertionError()",
+    )
+
+
+def test_crash_signature_uses_innermost_frames():
+    outer = crash_signature(("flow", "flow_deposit"), "Panic(0x11)", ["Router.deposit", "Vault.deposit", "Token.transferFrom", "Math.add"])
+    direct = crash_signature(("flow", "flow_deposit"), "Panic(0x11)", ["Vault.deposit", "Token.transferFrom", "Math.add"])
+    assert outer == direct
+    assert direct != crash_signature(("flow", "flow_deposit"), "Panic(0x12)", ["Vault.deposit", "Token.transferFrom", "Math.add"])
+    assert direct != crash_signature(("flow", "flow_withdraw"), "Panic(0x11)", ["Vault.deposit", "Token.transferFrom", "Math.add"])
+
+
+class _CrashingFuzz(FuzzTest):
+    @flow()
+    def flow_deposit(self):
+        raise ValueError("flow")
+
+    @invariant()
+    def invariant_balances(self):
+        raise ValueError("invariant")
+
+    def post_sequence(self):
+        self._check()
+
+    def _check(self):
+        return {}["missing"]
+
+
+def test_failing_step_from_traceback():
+    def step(call):
+        try:
+            call(_CrashingFuzz())
+        except Exception as e:
+            return _failing_step(_CrashingFuzz, e)
+
+    assert step(_CrashingFuzz.flow_deposit) == ("flow", "flow_deposit")
+    assert step(_CrashingFuzz.invariant_balances) == ("invariant", "invariant_balances")
+    ## innermost method of the test, not a shared "sequence" bucket
+    assert step(_CrashingFuzz.post_sequence) == ("hook", "_check")
+
+
+def test_shared_directory_leases_are_claimed_once(tmp_path):
+    shared = SharedDirectory(tmp_path, stale_after=0)
+    shared.plan(Campaign("VaultFuzz", 100, 25, 7, 8), range_size=10)
+    assert shared.campaign().seed(3) == Campaign("VaultFuzz", 100, 25, 7, 99).seed(3)
+
+    first = shared.claim("a")
+    second = shared.claim("b")
+    third = shared.claim("a")
+    assert [(l.start, l.stop) for l in (first, second, third)] == [(0, 10), (10, 20), (20, 25)]
+    assert shared.claim("b") is None
+
+    shared.complete(first)
+    shared.complete(third)
+    assert not shared.finished()
+    ## b is lost, its range is handed out again
+    assert shared.requeue_stale() == [second]
+    again = shared.claim("a")
+    assert (again.start, again.stop) == (10, 20)
+    shared.complete(again)
+    shared.complete(second)
+    assert shared.finished()
+
+
+def test_shared_directory_keeps_shortest_reproducer(tmp_path):
+    shared = SharedDirectory(tmp_path)
+    shared.plan(Campaign("VaultFuzz", 100, 10, 7, 8), range_size=10)
+
+    shared.report(_crash("a", 1, flows=80))
+    shared.report(_crash("b", 2, flows=12))
+    shared.report(_crash("b", 3, flows=40))
+    shared.report(_crash("a", 4, flows=5, step=("flow", "flow_deposit")))
+    new = shared.collect()
+
+    assert len(new) == 2
+    assert not list(shared.reports.iterdir())
+    buckets = shared.buckets()
+    bucket = buckets[_crash("a", 0, 0).signature]
+    assert bucket["count"] == 3
+    assert bucket["seen_by"] == ["a", "b"]
+    assert bucket["reproducer"]["index"] == 2
+    assert len(shared.summary()) == 2
+
+
+def test_retention_window_spills_oldest(tmp_path):
+    log = SpillLog(tmp_path / "txs.jsonl")
+    window = RetentionWindow(3, lambda key, value: log.write(key, {"value": value}))
+    for i in range(10):
+        window[f"0x{i}"] = i
+
+    assert list(window) == ["0x7", "0x8", "0x9"]
+    assert window.evicted == 7
+    assert log.count == 7
+    assert log.lookup("0x2") == {"key": "0x2", "value": 2}
+    assert log.lookup("0x9") is None
+    log.close()
+
+    unbounded = RetentionWindow()
+    for i in range(10):
+        unbounded[i] = i
+    assert len(unbounded) == 10 and unbounded.evicted == 0
+
+
+def test_trim_history_drops_oldest_keys_and_entries():
+    order = [f"0x{i}" for i in range(5)]
+    entries = {"0x1": 1, "0x4": 4, "0x8": 8, "0x9": 9}
+    spilled = []
+    assert trim_history(order, entries, 2, lambda key, value: spilled.append((key, value))) == 3
+    assert order == ["0x3", "0x4"]
+    assert entries == {"0x4": 4}
+    ## entries without a key in the history are dropped as well
+    assert spilled == [("0x0", None), ("0x1", 1), ("0x2", None), ("0x8", 8), ("0x9", 9)]
+
+
+def test_bounded_memory_trims_chain_transactions(tmp_path, monkeypatch):
+    txs = ChainTransactions(None)
+    hashes = [f"0x{i:064X}" for i in range(5)]
+    for tx_hash in hashes:
+        txs.register_tx(tx_hash)
+    ## ChainTransactions caches the objects it loaded under the lowercase hash
+    for i in (1, 3, 4):
+        txs._transactions[hashes[i].lower()] = _Tx(hashes[i], 21000 + i)
+    monkeypatch.setattr(bounded.chain, "_txs", txs, raising=False)
+    monkeypatch.setattr(bounded.BoundedMemoryFuzzTest, "RETAINED_TXS", 2)
+    monkeypatch.setattr(bounded.BoundedMemoryFuzzTest, "_spill_log", SpillLog(tmp_path / "txs.jsonl"))
+
+    test = bounded.BoundedMemoryFuzzTest()
+    test._trim(test._chain_txs())
+
+    assert txs._tx_hashes == hashes[3:]
+    assert set(txs._transactions) == {hashes[3].lower(), hashes[4].lower()}
+    assert txs[-1].gas_used == 21004
+    assert test.lookup_tx(hashes[4]).gas_used == 21004
+    assert test.lookup_tx(hashes[1]) == {"key": hashes[1], "gas_used": "21001"}
+    assert test.lookup_tx(hashes[0]) == {"key": hashes[0]}
+    assert test.lookup_tx("0x" + "f" * 64) is None
+    test._spill_log.close()
+
+
+def test_report_paths_do_not_collide(tmp_path):
+    paths = {report_path(tmp_path, "profile", ".json") for _ in range(3)}
+
+    assert len(paths) == 3
+    assert all(path.parent == tmp_path and path.name.startswith("profile-") and path.suffix == ".json" for path in paths)
@@ -9,6 +9,10 @@ from pytypes.contracts.Token import Token
 from pytypes.tests.helpers.MockERC20 import MockERC20
 from pytypes.contracts.Vault import SingleTokenVault
 
+from tests.helpers.block_batch import BlockBatch
+from tests.helpers.events import events_of
+from tests.helpers.predicted_revert import must_revert_call
+
 # from pytypes.openzeppelin.contracts.token.ERC20.ERC20 import ERC20
 
 
@@ -40,10 +44,7 @@ def test_token_mint_tokens():
     print(tx.call_trace)
     print(tx.events)
 
-    events: list[Token.TokensMinted] = []
-    for e in tx.events:
-        if isinstance(e, Token.TokensMinted):
-            events.append(e)
+    events = events_of(tx, Token.TokensMinted)
 
     assert len(events) == 1, "There should be 1 TokensMinted event"
     assert events[0].to == alice.address, "Recipient should be Alice"
@@ -69,10 +70,7 @@ def test_token_transfer():
 
     tx = token.transfer(bob.address, 500, from_=alice.address)
 
-    events: list[Token.Transfer] = []
-    for e in tx.events:
-        if isinstance(e, Token.Transfer):
-            events.append(e)
+    events = events_of(tx, Token.Transfer)
 
     assert len(events) == 1, "There should be 1 Transfer event"
     assert events[0].from_ == alice.address, "Sender should be Alice"
@@ -101,4 +99,103 @@ def test_token_transfer_not_enough_tokens():
     with must_revert(Token.NotEnoughTokens):
         token.transfer(bob.address, 500, from_=alice.address)
 
-    print("test_token_basic_operations done")
\ No newline at end of file
+    print("test_token_basic_operations done")
+
+
+@chain.connect()
+def test_token_events_of():
+
+    owner = chain.accounts[0]
+    alice = chain.accounts[1]
+    bob = chain.accounts[2]
+
+    token = Token.deploy(from_=owner)
+    token.mintTokens(alice.address, 1000, from_=owner)
+
+    tx = token.transfer(bob.address, 500, from_=alice.address)
+
+    # events_of decodes only the matching logs, the result must equal filtering tx.events
+    assert events_of(tx, Token.Transfer) == [e for e in tx.events if isinstance(e, Token.Transfer)]
+    assert events_of(tx, Token.Transfer, origin=token) == events_of(tx, Token.Transfer)
+    assert events_of(tx, Token.TokensMinted) == []
+
+    print("test_token_events_of done")
+
+
+@chain.connect()
+def test_token_predicted_reverts():
+
+    owner = chain.accounts[0]
+    alice = chain.accounts[1]
+    bob = chain.accounts[2]
+
+    token = Token.deploy(from_=owner)
+    block_number = chain.blocks["latest"].number
+
+    # executed as eth_call, no transaction is mined
+    must_revert_call(Token.NotAuthorized(alice.address), token.mintTokens, bob.address, 1000, from_=alice)
+    e = must_revert_call(Token.NotEnoughTokens, token.transfer, bob.address, 500, from_=alice)
+    assert e.requested == 500
+    assert e.balance == 0
+
+    assert chain.blocks["latest"].number == block_number
+
+    # promoted to a real transaction
+    must_revert_call(Token.NotAuthorized(alice.address), token.mintTokens, bob.address, 1000, from_=alice, promote=True)
+
+    print("test_token_predicted_reverts done")
+
+
+@chain.connect()
+def test_token_block_batch():
+
+    owner = chain.accounts[0]
+    alice = chain.accounts[1]
+    bob = chain.accounts[2]
+
+    token = Token.deploy(from_=owner)
+    token.mintTokens(alice.address, 1000, from_=owner)
+    block_number = chain.blocks["latest"].number
+
+    # a reverting transaction does not affect the others in the same block
+    with BlockBatch() as batch:
+        first = batch.send(token.transfer, bob.address, 300, from_=alice)
+        too_much = batch.send(token.transfer, bob.address, 5000, from_=alice)
+        second = batch.send(token.transfer, bob.address, 200, from_=alice)
+
+    assert batch.tx_count == 3
+    assert chain.blocks["latest"].number == block_number + 1
+    assert first.block_number == too_much.block_number == second.block_number == block_number + 1
+
+    assert first.error is None and second.error is None
+    assert isinstance(too_much.error, Token.NotEnoughTokens)
+    assert batch.errors == [None, too_much.error, None]
+    assert token.getBalance(bob.address) == 500
+    assert chain.automine
+
+    print("test_token_block_batch done")
+
+
+@chain.connect()
+def test_token_block_batch_restores_automine():
+
+    owner = chain.accounts[0]
+    alice = chain.accounts[1]
+
+    token = Token.deploy(from_=owner)
+
+    # pending transactions are still mined when the block raises, automine is switched back on
+    try:
+        with BlockBatch() as batch:
+            tx = batch.send(token.mintTokens, alice.address, 1000, from_=owner)
+            raise ValueError("failed in the middle of a batch")
+    except ValueError:
+        pass
+
+    assert chain.automine
+    assert batch.tx_count == 1
+    tx.wait()
+    assert tx.error is None
+    assert token.getBalance(alice.address) == 1000
+
+    print("test_token_block_batch_restores_automine done")
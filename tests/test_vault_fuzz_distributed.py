@@ -0,0 +1,22 @@
+import os
+from pathlib import Path
+
+from wake.testing import *
+
+from tests.helpers.distributed import SHARED_DIR_ENV, run_local, run_worker
+from tests.test_vault_fuzz_solution import VaultFuzz
+
+WORKERS = int(os.environ.get("WAKE_POOL_WORKERS", min(4, os.cpu_count() or 1)))
+
+
+## no chain.connect here, every worker connects to its own chain
+## with WAKE_FUZZ_SHARED_DIR set this process joins that campaign as one node, otherwise local workers stand in for nodes
+def test_vault_fuzz_distributed():
+    shared_dir = os.environ.get(SHARED_DIR_ENV)
+    if shared_dir:
+        run_worker(VaultFuzz, Path(shared_dir))
+        return
+
+    shared = run_local(VaultFuzz, sequences_count=40, flows_count=200, workers=WORKERS, range_size=5)
+    crashes = shared.summary()
+    assert not crashes, "\n".join(crashes)
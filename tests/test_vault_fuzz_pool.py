@@ -0,0 +1,14 @@
+import os
+
+from wake.testing import *
+
+from tests.helpers.worker_pool import run_pool
+from tests.test_vault_fuzz_solution import VaultFuzz
+
+WORKERS = int(os.environ.get("WAKE_POOL_WORKERS", min(4, os.cpu_count() or 1)))
+
+
+## no chain.connect here, every worker connects to its own chain
+def test_vault_fuzz_pool():
+
+    run_pool(VaultFuzz, sequences_count=20, flows_count=200, workers=WORKERS)
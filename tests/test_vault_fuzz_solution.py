@@ -1,7 +1,8 @@
 # Wake testing libraries
-from collections import defaultdict
 from dataclasses import dataclass
+from typing import Optional
 import logging
+import os
 from wake.testing import *
 from wake.testing.fuzzing import *
 
@@ -10,13 +11,53 @@ from pytypes.contracts.Vault import SingleTokenVault
 
 from pytypes.tests.helpers.MockERC20 import MockERC20
 
+from tests.helpers.adaptive_flows import AdaptiveFuzzTest
+from tests.helpers.block_batch import BlockBatch
+from tests.helpers.bounded import BoundedMemoryFuzzTest
+from tests.helpers.dirty_set import DirtySet
+from tests.helpers.events import events_of
+from tests.helpers.fixed_setup import FixedSetupFuzzTest
+from tests.helpers.indexed_set import IndexedSet
+from tests.helpers.input_pool import UINT256_MAX, InputPools
+from tests.helpers.ledger import Ledger
+from tests.helpers.logged import LoggedFuzzTest
+from tests.helpers.profiled import ProfiledFuzzTest
+from tests.helpers.multicall import BatchReader
+from tests.helpers.predicted_revert import must_revert_call
+from tests.helpers.sampled_invariants import SampledInvariantsFuzzTest
+from tests.helpers.steps_tracing import without_steps_tracing
+from tests.helpers.storage import StorageReader
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+## WAKE_FUZZ_STEPS_TRACING=0 launches anvil without --steps-tracing: faster clean runs,
+## but call traces printed on failure and crash signatures lose the contract frames
+if os.environ.get("WAKE_FUZZ_STEPS_TRACING") == "0":
+    without_steps_tracing()
+
+
+class VaultFuzz(SampledInvariantsFuzzTest, LoggedFuzzTest, BoundedMemoryFuzzTest, ProfiledFuzzTest, AdaptiveFuzzTest, FixedSetupFuzzTest):
+
+    ## users picked by the flows are the first TRACKED_USERS chain accounts (all accounts if None)
+    TRACKED_USERS: Optional[int] = None
 
-class VaultFuzz(FuzzTest):
+    ## chain snapshot + model copy every CHECKPOINT_INTERVAL flows when shrinking or bisecting, failing sequences are replayed from these
+    CHECKPOINT_INTERVAL = 50
+
+    ## invariants run after every INVARIANT_PERIOD-th flow (Wake's invariant period) and at the end of each sequence
+    ## a failing check is bisected to the first violating flow by replaying from a checkpoint
+    INVARIANT_PERIOD = 10
+
+    ## flows log structured records through self.log, the last FLOW_LOG_SIZE are written only on failure
+    FLOW_LOG_SIZE = 1000
+
+    ## with WAKE_RETAINED_TXS=<n> only the last n transactions stay in memory, older ones are spilled to .wake/logs/txs
+    RETAINED_TXS = BoundedMemoryFuzzTest.RETAINED_TXS
 
     ## Define data structures
+    users: IndexedSet[Account]
+    transfer_targets: IndexedSet[Account]
     token: MockERC20
     vault: SingleTokenVault
     vault_owner: Account
@@ -24,32 +65,95 @@ class VaultFuzz(FuzzTest):
     min_deposit_amount: int
     max_deposit_amount: int
 
-    deposit_amounts: dict[Account, int]
-    token_balances: dict[Account, int]
+    ## accounts are interned to dense indices, balances are kept in one list per ledger
+    deposit_amounts: Ledger[Account]
+    total_deposits: int
+    token_balances: Ledger[Account]
 
+    ## accounts touched by flows since the last invariant check
+    ## full sweep over the whole model every FULL_SWEEP_PERIOD flows and at the end of each sequence
+    FULL_SWEEP_PERIOD = 100
+    dirty: DirtySet[Account]
 
-    def pre_sequence(self):
+    ## on-chain state read before the invariants run
+    ## token balances in one batched eth_call, vault variables in one batched storage request
+    reader: BatchReader
+    vault_storage: StorageReader
+    ## accounts read from the chain, None when the whole ledger was read in index order
+    chain_deposit_users: Optional[list[Account]]
+    chain_deposit_amounts: list[int]
+    chain_total_deposits: int
+    chain_token_users: Optional[list[Account]]
+    chain_token_balances: list[int]
+    chain_min_deposit_amount: int
+    chain_max_deposit_amount: int
 
-        self.vault_owner = random_account()
-        self.token_balances = defaultdict(int)
+    ## pre-generated random inputs per flow parameter, with boundary-value biasing
+    inputs: InputPools
 
-        self.deposit_amounts = defaultdict(int)
+
+    ## deployed once per run, every sequence starts from this chain state
+    def setup_fixed(self):
+
+        self.vault_owner = random_account()
+        self.users = IndexedSet(chain.accounts[:self.TRACKED_USERS])
+        self.reader = BatchReader.deploy()
         self.token = MockERC20.deploy("MockERC20", "MCK")
 
+        ## real limits are set at the start of each sequence
+        self.vault = SingleTokenVault.deploy(self.token.address, 0, 1, from_=self.vault_owner)
+        self.vault_storage = StorageReader(self.vault)
+        self.transfer_targets = IndexedSet(list(self.users) + [self.vault, self.token])
+        self.track_gas(self.vault, self.token)
+
+        logger.info(f"initialized contracts")
+
+
+    ## randomized part of the setup, runs at the start of each sequence
+    def setup_sequence(self):
+
+        self.token_balances = Ledger()
+
+        ## only deposits are sampled by balance, flow_withdraw draws from deposit_amounts.positive
+        self.deposit_amounts = Ledger(track_positive=True)
+        self.total_deposits = 0
+        self.dirty = DirtySet(self.FULL_SWEEP_PERIOD)
+        self.inputs = InputPools()
 
         self.min_deposit_amount = random_int(0, 10**18)
         self.max_deposit_amount = random_int(self.min_deposit_amount, 10**20)
 
-        self.vault = SingleTokenVault.deploy(self.token.address, self.min_deposit_amount, self.max_deposit_amount, from_=self.vault_owner)
+        self.vault.setDepositLimits(self.min_deposit_amount, self.max_deposit_amount, from_=self.vault_owner)
+
+        logger.info(f"set initial deposit limits")
 
-        logger.info(f"initialized contracts")
+
+    def deposit_error(self, amount: int):
+        if amount == 0:
+            return SingleTokenVault.ZeroAmount
+        if amount < self.min_deposit_amount:
+            return SingleTokenVault.BelowMinDeposit
+        if amount > self.max_deposit_amount:
+            return SingleTokenVault.AboveMaxDeposit
+        return None
 
 
     @flow()
     def flow_deposit(self):
 
-        user = random_account()
-        amount = random_int(self.min_deposit_amount, self.max_deposit_amount)
+        user = self.users.choice()
+        ## boundary values outside the limits are drawn on purpose, the model predicts the revert
+        amount = self.inputs["deposit.amount"].draw(
+            self.min_deposit_amount,
+            self.max_deposit_amount,
+            boundaries=(0, self.min_deposit_amount, self.max_deposit_amount, self.max_deposit_amount + 1, UINT256_MAX),
+        )
+
+        error = self.deposit_error(amount)
+        if error is not None:
+            must_revert_call(error, self.vault.deposit, amount, from_=user)
+            self.log("deposit_reverted", user=user, amount=amount, error=error.__name__)
+            return
 
         mint_erc20(self.token, user, amount)
         self.token_balances[user] += amount
@@ -58,77 +162,125 @@ class VaultFuzz(FuzzTest):
         with may_revert() as e:
             tx = self.vault.deposit(amount, from_=user)
 
-            # print(tx.call_trace)
-
+        ## the call trace is fetched from the node only here, clean runs never trace
+        if e.value is not None and e.value.tx is not None:
+            print(e.value.tx.call_trace)
         assert e.value is None
 
-        events: list[SingleTokenVault.Deposited] = []
-        for e in tx.events:
-            if isinstance(e, SingleTokenVault.Deposited):
-                events.append(e)
-
-        ## Shorter version of the above
-        # events = [e for e in tx.events if isinstance(e, SingleTokenVault.Deposited)]
+        ## decodes only the Deposited logs, MockERC20 Transfer and Approval logs are skipped
+        events = events_of(tx, SingleTokenVault.Deposited)
 
         assert len(events) == 1
         assert events[0].user == user.address
         assert events[0].amount == amount
 
         self.deposit_amounts[user] += amount
+        self.total_deposits += amount
 
-        self.token_balances[user] -= amount
-        self.token_balances[self.vault] += amount
+        self.token_balances.apply([(user, -amount), (self.vault, amount)])
+        self.dirty.touch(user, self.vault)
 
-        logger.info(f"deposited {amount} from {user.address}")
+        self.log("deposit", tx, user=user, amount=amount)
 
 
+    ## approve + deposit for several users, all mined together in one block
     @flow()
-    def flow_withdraw(self):
+    def flow_deposit_many(self):
+
+        users = [self.users.choice() for _ in range(random_int(2, 5))]
+        amounts = [self.inputs["deposit_many.amount"].draw(self.min_deposit_amount, self.max_deposit_amount) for _ in users]
+
+        for user, amount in zip(users, amounts):
+            mint_erc20(self.token, user, amount)
+            self.token_balances[user] += amount
+
+        txs = []
+        with BlockBatch() as batch:
+            for user, amount in zip(users, amounts):
+                batch.send(self.token.approve, self.vault.address, amount, from_=user)
+                txs.append(batch.send(self.vault.deposit, amount, from_=user))
+
+        assert all(error is None for error in batch.errors)
+        assert len({tx.block_number for tx in batch.txs}) == 1
+
+        for user, amount, tx in zip(users, amounts, txs):
+            events = events_of(tx, SingleTokenVault.Deposited)
+            assert len(events) == 1
+            assert events[0].user == user.address
+            assert events[0].amount == amount
 
-        eligible_users = [user for user in self.deposit_amounts.keys() if self.deposit_amounts[user] > 0]
+            self.deposit_amounts[user] += amount
+            self.total_deposits += amount
+            self.token_balances.apply([(user, -amount), (self.vault, amount)])
+            self.dirty.touch(user, self.vault)
 
-        if not eligible_users:
-            return "No eligible users"
+        self.log("deposit_many", txs[-1], users=users, amounts=amounts)
 
-        user = random.choice(eligible_users)
 
-        amount = random_int(0, self.deposit_amounts[user])
+    ## preconditions are evaluated on the Python model before the draw, flows that would be no-ops are never picked
+    ## deposit_amounts.positive holds the users with a positive deposit, kept up to date by the ledger
+    ## the vault's token balance comes from the model too, it drops below the deposits after an emergency withdraw
+    @flow(precondition=lambda self: len(self.deposit_amounts.positive) > 0 and self.token_balances.get(self.vault, 0) > 0)
+    def flow_withdraw(self):
+
+        user = self.deposit_amounts.positive.choice()
 
-        if self.vault.balanceOf(self.vault) < amount:
-            return "vault Insufficient balance"
+        ## a zero amount reverts with ZeroAmount, both bounds are positive by the precondition
+        amount = random_int(1, min(self.deposit_amounts[user], self.token_balances[self.vault]))
 
         tx = self.vault.withdraw(amount, from_=user)
 
-        events: list[SingleTokenVault.Withdrawn] = []
-        for e in tx.events:
-            if isinstance(e, SingleTokenVault.Withdrawn):
-                events.append(e)
+        events = events_of(tx, SingleTokenVault.Withdrawn)
 
         assert len(events) == 1
         assert events[0].user == user.address
         assert events[0].amount == amount
 
         self.deposit_amounts[user] -= amount
+        self.total_deposits -= amount
 
-        self.token_balances[self.vault] -= amount
-        self.token_balances[user] += amount
+        self.token_balances.apply([(self.vault, -amount), (user, amount)])
+        self.dirty.touch(user, self.vault)
 
-        logger.info(f"withdrawn {amount} from {user.address}")
+        self.log("withdraw", tx, user=user, amount=amount)
 
-    @flow()
+    @flow(precondition=lambda self: self.token_balances.get(self.vault, 0) > 0)
     def flow_emergency_withdraw(self):
 
         amount = self.token_balances[self.vault]
 
-        if amount == 0:
-            return "No tokens to withdraw"
+        tx = self.vault.emergencyWithdraw(from_=self.vault_owner)
+
+        self.token_balances.apply([(self.vault, -amount), (self.vault_owner, amount)])
+        self.dirty.touch(self.vault, self.vault_owner)
+
+        self.log("emergency_withdraw", tx, amount=amount)
+
+    ## negative paths, the model knows these must revert so they run as eth_call without mining a block
+
+    @flow(precondition=lambda self: self.min_deposit_amount > 1)
+    def flow_deposit_below_min(self):
+
+        user = self.users.choice()
+        amount = random_int(1, self.min_deposit_amount - 1)
+
+        must_revert_call(SingleTokenVault.BelowMinDeposit, self.vault.deposit, amount, from_=user)
+
+    @flow()
+    def flow_deposit_above_max(self):
+
+        user = self.users.choice()
+        amount = random_int(self.max_deposit_amount + 1, self.max_deposit_amount + 10**18)
+
+        must_revert_call(SingleTokenVault.AboveMaxDeposit, self.vault.deposit, amount, from_=user)
 
-        self.vault.emergencyWithdraw(from_=self.vault_owner)
+    @flow()
+    def flow_withdraw_above_balance(self):
 
-        self.token_balances[self.vault] -= amount
-        self.token_balances[self.vault_owner] += amount
+        user = self.users.choice()
+        amount = random_int(self.deposit_amounts[user] + 1, self.deposit_amounts[user] + 10**18)
 
-        logger.info(f"emergency withdrawn from {self.vault.address}")
+        must_revert_call(SingleTokenVault.InsufficientBalance, self.vault.withdraw, amount, from_=user)
 
     @flow()
     def flow_set_deposit_limits(self):
@@ -136,7 +288,7 @@ class VaultFuzz(FuzzTest):
         max_amount = random_int(min_amount, 10**21)
         tx = self.vault.setDepositLimits(min_amount, max_amount, from_=self.vault_owner)
 
-        events = [e for e in tx.events if isinstance(e, SingleTokenVault.DepositLimitsUpdated)]
+        events = events_of(tx, SingleTokenVault.DepositLimitsUpdated)
         assert len(events) == 1
         assert events[0].minAmount == min_amount
         assert events[0].maxAmount == max_amount
@@ -144,46 +296,110 @@ class VaultFuzz(FuzzTest):
         self.min_deposit_amount = min_amount
         self.max_deposit_amount = max_amount
 
-        logger.info(f"set deposit limits to {min_amount} and {max_amount}")
+        self.log("set_deposit_limits", tx, min_amount=min_amount, max_amount=max_amount)
 
 
     @flow()
     def flow_transfer_token_to_random(self):
 
-        source = random.choice(list(chain.accounts))
-        amount = random_int(0, 10**20)
+        source = self.users.choice()
+        amount = self.inputs["transfer.amount"].draw(0, 10**20)
         mint_erc20(self.token, source, amount)
         self.token_balances[source] += amount
 
-        targets = list(chain.accounts) +[self.vault, self.token]
-        target = random.choice(targets)
+        target = self.transfer_targets.choice()
+
+        tx = self.token.transfer(target, amount, from_=source)
+
+        self.token_balances.apply([(target, amount), (source, -amount)])
+        self.dirty.touch(source, target)
+
+        self.log("transfer", tx, source=source, target=target, amount=amount)
+
+
+
+    def pre_flow(self, flow):
+        super().pre_flow(flow)
+        self.inputs.new_flow()
+
+    def post_flow(self, flow):
+        super().post_flow(flow)
+        self.dirty.flow_done()
 
-        self.token.transfer(target, amount, from_=source)
+    def pre_invariants(self):
+        super().pre_invariants()
+        if not self.invariants_due:
+            return
+        with self.profiled("read_chain_state"):
+            self.read_chain_state()
 
-        self.token_balances[target] += amount
-        self.token_balances[source] -= amount
+    def post_invariants(self):
+        super().post_invariants()
+        ## flows between invariant checks stay dirty until the next check
+        if self.invariants_due:
+            self.dirty.checked()
 
-        logger.info(f"randomly transferred {amount} to {target.address}")
+    def scheduler_state(self):
+        return (self.total_deposits > 0, self.token_balances.get(self.vault, 0) > 0)
 
+    def post_sequence(self):
+        super().post_sequence()
 
+        ## flows after the last checkpoint were only checked incrementally
+        self.dirty.request_full_sweep()
+        self.read_chain_state()
+        self.invariant_deposit_amounts()
+        self.invariant_total_deposits()
+        self.invariant_token_balances()
+        self.dirty.checked()
 
-    @invariant()
+
+    def read_chain_state(self):
+        if self.dirty.full_sweep:
+            self.chain_deposit_users = self.chain_token_users = None
+            deposit_users = self.deposit_amounts.keys
+            token_users = self.token_balances.keys
+        else:
+            deposit_users = self.chain_deposit_users = self.dirty.select(self.deposit_amounts)
+            token_users = self.chain_token_users = self.dirty.select(self.token_balances)
+
+        storage = self.vault_storage
+        vault_values = storage.read(
+            [storage.mapping_slot("_balances", user) for user in deposit_users]
+            + [storage.slot("totalDeposits"), storage.slot("minDepositAmount"), storage.slot("maxDepositAmount")]
+        )
+        self.chain_deposit_amounts = vault_values[:-3]
+        self.chain_total_deposits, self.chain_min_deposit_amount, self.chain_max_deposit_amount = vault_values[-3:]
+
+        token_values = self.reader.read([(self.token.balanceOf, [user.address]) for user in token_users])
+        self.chain_token_balances = token_values
+
+
+    @invariant(period=INVARIANT_PERIOD)
     def invariant_deposit_amounts(self):
-        for user in self.deposit_amounts.keys():
-            assert self.vault.balanceOf(user.address) == self.deposit_amounts[user]
+        mismatches = self.deposit_amounts.mismatches(self.chain_deposit_amounts, self.chain_deposit_users)
+        assert not mismatches, f"vault balances differ (account, expected, actual): {mismatches}"
+
+    @invariant(period=INVARIANT_PERIOD)
+    def invariant_total_deposits(self):
+        assert self.chain_total_deposits == self.total_deposits
+
+        ## on a full sweep all _balances entries were read, so their sum can be checked directly
+        if self.dirty.full_sweep:
+            assert sum(self.chain_deposit_amounts) == self.chain_total_deposits
 
-    @invariant()
+    @invariant(period=INVARIANT_PERIOD)
     def invariant_token_balances(self):
-        for user in self.token_balances.keys():
-            assert self.token.balanceOf(user.address) == self.token_balances[user]
+        mismatches = self.token_balances.mismatches(self.chain_token_balances, self.chain_token_users)
+        assert not mismatches, f"token balances differ (account, expected, actual): {mismatches}"
 
-    @invariant()
+    @invariant(period=INVARIANT_PERIOD)
     def invariant_min_deposit_amount(self):
-        assert self.vault.minDepositAmount() == self.min_deposit_amount
+        assert self.chain_min_deposit_amount == self.min_deposit_amount
 
-    @invariant()
+    @invariant(period=INVARIANT_PERIOD)
     def invariant_max_deposit_amount(self):
-        assert self.vault.maxDepositAmount() == self.max_deposit_amount
+        assert self.chain_max_deposit_amount == self.max_deposit_amount
 
 
 @chain.connect()
@@ -7,6 +7,8 @@ from wake.testing import Eip712Domain
 from pytypes.contracts.EIP712Example import EIP712Example
 from pytypes.contracts.PermitToken import PermitToken
 
+from tests.helpers.eip712 import domain_separator, sign, sign_batch, split_signature, struct_encoder
+
 
 def revert_handler(e):
     if e.tx is not None:
@@ -168,3 +170,99 @@ def test_permit_token():
     allowance = permit_token.allowance(owner=alice.address, spender=bob.address)
     assert allowance == 1000
 
+
+@chain.connect()
+def test_eip712_signer():
+
+    alice = chain.accounts[0]
+    bob = chain.accounts[1]
+    carol = chain.accounts[2]
+
+    eip712_example = EIP712Example.deploy()
+
+    domain = Eip712Domain(
+        name="SimpleVoting",
+        version="1",
+        chainId=chain.chain_id,
+        verifyingContract=eip712_example.address,
+    )
+
+    ## type hash and domain separator are derived once and match the contract
+    encoder = struct_encoder(EIP712Example.Vote)
+    assert encoder.type_string == "Vote(string proposal,bool support,uint256 nonce)"
+    assert encoder.type_hash == eip712_example.VOTE_TYPEHASH()
+    assert domain_separator(domain) == eip712_example.DOMAIN_SEPARATOR()
+
+    vote = EIP712Example.Vote(proposal="Proposal 1", support=True, nonce=0)
+    assert sign(alice, vote, domain) == split_signature(alice.sign_structured(vote, domain))
+
+    ## many messages across many accounts, signed sequentially and in a process pool
+    messages = [
+        (voter, EIP712Example.Vote(proposal=f"Proposal {i}", support=i % 2 == 0, nonce=i))
+        for voter in (alice, bob)
+        for i in range(10)
+    ]
+    signatures = sign_batch(messages, domain)
+    assert sign_batch(messages, domain, processes=2) == signatures
+
+    for (voter, vote), (v, r, s) in zip(messages, signatures):
+        eip712_example.castVoteBySignature(
+            voter=voter.address,
+            proposal=vote.proposal,
+            support=vote.support,
+            v=v,
+            r=r,
+            s=s,
+            from_=carol,
+        )
+
+    assert eip712_example.getVoteCounts(proposal="Proposal 0") == (2, 0)
+    assert eip712_example.getVoteCounts(proposal="Proposal 1") == (0, 2)
+
+
+@chain.connect()
+def test_eip712_signer_permit():
+
+    alice = chain.accounts[0]
+    bob = chain.accounts[1]
+
+    permit_token = PermitToken.deploy(alice)
+
+    @dataclass
+    class Permit:
+        owner: Address
+        spender: Address
+        value: uint256
+        nonce: uint256
+        deadline: uint256
+
+    domain = Eip712Domain(
+        name="PermitToken",
+        version="1",
+        chainId=chain.chain_id,
+        verifyingContract=permit_token.address,
+    )
+    assert domain_separator(domain) == permit_token.DOMAIN_SEPARATOR()
+
+    permit = Permit(
+        owner=alice.address,
+        spender=bob.address,
+        value=1000,
+        nonce=permit_token.nonces(alice.address),
+        deadline=chain.blocks["latest"].timestamp + 1000,
+    )
+    v, r, s = sign(alice, permit, domain)
+
+    permit_token.permit(
+        owner=permit.owner,
+        spender=permit.spender,
+        value_=permit.value,
+        deadline=permit.deadline,
+        v=v,
+        r=r,
+        s=s,
+        from_=bob
+    )
+
+    assert permit_token.allowance(owner=alice.address, spender=bob.address) == 1000
+